@@ -6,7 +6,11 @@ obj = [level, pos, length, speed]
 """
 
 import numpy as np
-from skvideo.io import FFmpegWriter as vwriter
+import numba as nb
+try: # only needed for video
+    from skvideo.io import FFmpegWriter as vwriter
+except ImportError:
+    vwriter = None
 
 n_levels_left = 2
 n_levels_right = 2
@@ -117,38 +121,85 @@ def isCollision(objects):
 fp_rate = 0.15
 detect_prob = .99
 pos_noise_std = 0.75
+@nb.jit(nopython=True)
+def _searchsorted(edges, n_edges, value):
+    """ np.searchsorted(edges[:n_edges], value) """
+    low = 0
+    high = n_edges
+    while low < high:
+        mid = (low + high) // 2
+        if edges[mid] < value:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+@nb.jit(nopython=True)
+def _visibility(levels, lefts, rights):
+    """
+    sweeps through objects (or measurements) from the nearest level out,
+    keeping the sorted angles that flip the openness of the space in a buffer
+    levels must be sorted, within a level the order decides what occludes what
+    returns a detection row (see sense_OWO) for each, and whether it is visible
+    """
+    n = levels.shape[0]
+    detections = np.zeros((n, 7))
+    visible = np.zeros(n, dtype=np.bool_)
+    edges = np.empty(2*n)
+    n_edges = 0
+    for k in range(n):
+        level = levels[k]
+        cross_len = crossing_len * (level+1)
+        left_pos = lefts[k]
+        right_pos = rights[k]
+        left_angle = left_pos/cross_len
+        right_angle = right_pos/cross_len
+        left_edge = _searchsorted(edges, n_edges, left_angle)
+        right_edge = _searchsorted(edges, n_edges, right_angle)
+        edge_visible_left = left_edge%2==0 # open space
+        if left_edge == right_edge and not edge_visible_left:
+            continue # full occlusion
+        edge_visible_right = right_edge%2==0
+        visible[k] = True
+        detections[k,0] = level
+        if edge_visible_left:
+            detections[k,1] = 1.
+            detections[k,2] = left_pos
+            detections[k,3] = left_pos
+        else:
+            detections[k,2] = edges[left_edge-1]*cross_len
+            detections[k,3] = edges[left_edge]*cross_len
+        if edge_visible_right:
+            detections[k,4] = 1.
+            detections[k,5] = right_pos
+            detections[k,6] = right_pos
+        else:
+            detections[k,5] = edges[right_edge-1]*cross_len
+            detections[k,6] = edges[right_edge]*cross_len
+        # edges[left_edge:right_edge] are replaced by the new edges
+        n_new = int(edge_visible_left) + int(edge_visible_right)
+        shift = n_new - (right_edge - left_edge)
+        if shift > 0:
+            for idx in range(n_edges-1, right_edge-1, -1):
+                edges[idx+shift] = edges[idx]
+        elif shift < 0:
+            for idx in range(right_edge, n_edges):
+                edges[idx+shift] = edges[idx]
+        n_edges += shift
+        if edge_visible_left:
+            edges[left_edge] = left_angle
+        if edge_visible_right:
+            edges[left_edge + n_new - 1] = right_angle
+    return detections, visible
+
 def sense_OWO(objects, rng=np.random):
-    detections = []
+    objects = np.array(objects, dtype=float).reshape((-1,4))
     # determine which objects (and which parts of objects) are visible
-    edges = [] # flip the openness of the space
-    for level in range(n_levels):
-        cross_len = crossing_len * (level+1)
-        for obj_level, pos, length, speed in objects:
-            if obj_level != level: continue
-            left_pos, right_pos = getLR(pos, length, speed)
-            left_angle = left_pos/cross_len
-            right_angle = right_pos/cross_len
-            left_edge, right_edge = np.searchsorted(edges, [left_angle, right_angle])
-            new_edges = []
-            edge_visible_left = left_edge%2==0 # open space
-            if left_edge == right_edge and not edge_visible_left:
-                continue # full occlusion
-            if edge_visible_left:
-                edge_output_left = [True, left_pos, left_pos]
-                new_edges += [left_angle]
-            else:
-                edge_output_left = [False, edges[left_edge-1]*cross_len,
-                                           edges[left_edge]*cross_len]
-            edge_visible_right = right_edge%2==0
-            if edge_visible_right:
-                edge_output_right = [True, right_pos, right_pos]
-                new_edges += [right_angle]
-            else:
-                edge_output_right = [False, edges[right_edge-1]*cross_len,
-                                           edges[right_edge]*cross_len]
-            detections += [[level]+edge_output_left+edge_output_right]
-            edges = edges[:left_edge] + new_edges + edges[right_edge:]
-    detections = np.array(detections, dtype=float)
+    objects = objects[np.argsort(objects[:,0], kind='mergesort')]
+    left_pos, right_pos = getLR(objects[:,1], objects[:,2], objects[:,3])
+    detections, visible = _visibility(objects[:,0].astype(np.int64),
+                                      left_pos, right_pos)
+    detections = detections[visible]
     
     # false negatives
     keep_detections = rng.rand(detections.shape[0]) < detect_prob
@@ -178,6 +229,7 @@ def sense_OWO(objects, rng=np.random):
     return detections
 
 def sense_MWO(objects, rng=np.random):
+    objects = np.array(objects, dtype=float).reshape((-1,4))
     # false positives
     num_fp = rng.poisson(fp_rate)
     fp_dets = rng.uniform([0, -road_len, min_car_len, -1],
@@ -190,8 +242,7 @@ def sense_MWO(objects, rng=np.random):
     objects = objects[keep_detections]
     
     # noise
-    measurements = np.array([getLR(pos, length, speed) for
-                             obj_level, pos, length, speed in objects])
+    measurements = np.array(getLR(objects[:,1], objects[:,2], objects[:,3])).T
     measurements += rng.normal(scale=pos_noise_std, size=measurements.shape)
     measurements = np.append(objects[:,:1], measurements, axis=1)
 #    pos_noise = rng.normal(scale=pos_noise_std, size=objects.shape[0])
@@ -199,39 +250,12 @@ def sense_MWO(objects, rng=np.random):
 #    length_noise = rng.normal(scale=pos_noise_std, size=objects.shape[0])
 #    objects[:,2] += length_noise
     
-    detections = []
     # determine which objects (and which parts of objects) are visible
-    edges = [] # flip the openness of the space
-    for level in range(n_levels):
-        cross_len = crossing_len * (level+1)
-        #for obj_level, pos, length, speed in objects:
-        #    if obj_level != level: continue
-        #    left_pos, right_pos = getLR(pos, length, speed)
-        for left_pos, right_pos in measurements[measurements[:,0]==level,1:]:
-            left_angle = left_pos/cross_len
-            right_angle = right_pos/cross_len
-            left_edge, right_edge = np.searchsorted(edges, [left_angle, right_angle])
-            new_edges = []
-            edge_visible_left = left_edge%2==0 # open space
-            if left_edge == right_edge and not edge_visible_left:
-                continue # full occlusion
-            if edge_visible_left:
-                edge_output_left = [True, left_pos, left_pos]
-                new_edges += [left_angle]
-            else:
-                edge_output_left = [False, edges[left_edge-1]*cross_len,
-                                           edges[left_edge]*cross_len]
-            edge_visible_right = right_edge%2==0
-            if edge_visible_right:
-                edge_output_right = [True, right_pos, right_pos]
-                new_edges += [right_angle]
-            else:
-                edge_output_right = [False, edges[right_edge-1]*cross_len,
-                                           edges[right_edge]*cross_len]
-            detections += [[level]+edge_output_left+edge_output_right]
-            edges = edges[:left_edge] + new_edges + edges[right_edge:]
-    detections = np.array(detections, dtype=float)
-    return detections
+    measurements = measurements[np.argsort(measurements[:,0], kind='mergesort')]
+    detections, visible = _visibility(measurements[:,0].astype(np.int64),
+                                      np.ascontiguousarray(measurements[:,1]),
+                                      np.ascontiguousarray(measurements[:,2]))
+    return detections[visible]
 
 def simpleInit(rng = np.random):
     planned_objects = []
@@ -255,7 +279,7 @@ n_vert_pixels = int(crossing_len*(n_levels+1)*ppm)
 n_horz_pixels = int(road_len*2*ppm)
 im = np.zeros((n_vert_pixels, n_horz_pixels, 3), dtype=np.uint8) + 255
 # little green square for your car/frog
-im[-ppm:, n_horz_pixels/2-ppm:n_horz_pixels/2+ppm, :] = [10,255,10]
+im[-ppm:, n_horz_pixels//2-ppm:n_horz_pixels//2+ppm, :] = [10,255,10]
 # useful info
 n_objects = 0
 speeds = []
@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+the simulator in frogger.py, for many independent episodes at once
+each attribute of the objects is a (n_episodes, capacity) array, with unused
+slots marked inactive, so one step moves every object of every episode
+every level has exactly one planned object at a time (as in frogger.update),
+so planned objects are (n_episodes, n_levels) arrays
+the random draws are made in a different order than in frogger.update, so an
+episode is not identical to the list version with the same seed, but follows
+the same distribution
+
+highway = Highway(100, rng=np.random.RandomState(0))
+for step in range(2000):
+    n_new_objects = highway.step()
+    objects = highway.objects(0) # [level, pos, length, speed] of episode 0
+    measurements = sim.sense_MWO(objects)
+"""
+import numpy as np
+import frogger as sim
+
+class Highway():
+    def __init__(self, n_episodes=1, capacity=16, rng=np.random):
+        self.rng = rng
+        self.n_episodes = n_episodes
+        shape = (n_episodes, capacity)
+        self.active = np.zeros(shape, dtype=bool)
+        self.level = np.zeros(shape, dtype=int)
+        self.pos = np.zeros(shape)
+        self.length = np.zeros(shape)
+        self.speed = np.zeros(shape)
+        # planned objects, same start as frogger.simpleInit
+        levels = np.arange(sim.n_levels)
+        sign = np.where(levels < sim.n_levels_left, 1., -1.)
+        shape = (n_episodes, sim.n_levels)
+        self.planned_time = np.zeros(shape)
+        self.planned_pos = np.zeros(shape) - sign*sim.road_len
+        self.planned_length = np.zeros(shape) + 4
+        self.planned_speed = np.zeros(shape) + sign*3.5
+        self.sign = sign
+
+    def _grow(self):
+        """ doubles the number of object slots for each episode """
+        for name in ('active', 'level', 'pos', 'length', 'speed'):
+            old = getattr(self, name)
+            setattr(self, name, np.append(old, np.zeros(old.shape, old.dtype),
+                                          axis=1))
+
+    def _genNextObjects(self, entering):
+        """ frogger.genNextObject for every planned object that is entering,
+            the new planned objects replace them """
+        levels = np.nonzero(entering)[1]
+        old_speed = np.abs(self.planned_speed[entering])
+        max_speed = np.minimum(old_speed + 1, sim.max_car_speed)
+        min_speed = np.maximum(old_speed - 1, sim.min_car_speed)
+        speed = self.rng.uniform(min_speed, max_speed)
+        old_time_to_pass = (sim.road_len*2+self.planned_length[entering])/old_speed
+        new_time_to_pass = sim.road_len*2/speed
+        min_time = np.where(speed > self.planned_speed[entering],
+                            np.maximum(0.1, old_time_to_pass-new_time_to_pass),
+                            0.1)
+        time = self.rng.uniform(min_time, 15)
+        length = self.rng.uniform(sim.min_car_len, sim.max_car_len,
+                                  size=levels.shape[0])
+        self.planned_time[entering] += time
+        self.planned_pos[entering] = -self.sign[levels]*sim.road_len
+        self.planned_length[entering] = length
+        self.planned_speed[entering] = self.sign[levels]*speed
+
+    def step(self):
+        """ frogger.update for all episodes
+            returns the number of new objects in each episode """
+        active = self.active
+        if sim.speed_walk_std > 0:
+            self.speed[active] += self.rng.normal(scale=sim.speed_walk_std,
+                                                  size=np.sum(active))
+        self.pos += self.speed
+        active &= np.abs(self.pos) < sim.road_len + self.length
+
+        entering = self.planned_time <= 0
+        self.planned_time[~entering] -= 1
+        n_new_objects = np.sum(entering, axis=1)
+        if n_new_objects.max() > 0:
+            # the n'th entering object of an episode takes its n'th free slot
+            while np.min(np.sum(~active, axis=1) - n_new_objects) < 0:
+                self._grow()
+                active = self.active
+            episodes, levels = np.nonzero(entering)
+            rank = np.cumsum(entering, axis=1)[entering]
+            free_rank = np.cumsum(~active, axis=1)
+            slots = np.argmax((free_rank[episodes] == rank[:,None]) &
+                              ~active[episodes], axis=1)
+            entry_time = self.planned_time[entering]
+            active[episodes, slots] = True
+            self.level[episodes, slots] = levels
+            self.pos[episodes, slots] = (self.planned_pos[entering] -
+                                         self.planned_speed[entering]*entry_time)
+            self.length[episodes, slots] = self.planned_length[entering]
+            self.speed[episodes, slots] = self.planned_speed[entering]
+            self._genNextObjects(entering)
+        return n_new_objects
+
+    def collisions(self):
+        """ frogger.isCollision for each episode
+            sorts each level's objects by left end, then only neighbors need
+            to be checked for overlap """
+        left, right = sim.getLR(self.pos, self.length, self.speed)
+        left = np.where(self.active, left, np.inf)
+        order = np.lexsort((left, self.level + sim.n_levels*~self.active))
+        episodes = np.arange(self.n_episodes)[:,None]
+        level = self.level[episodes, order]
+        active = self.active[episodes, order]
+        left = left[episodes, order]
+        right = right[episodes, order]
+        overlap = ((right[:,:-1] > left[:,1:]) & (level[:,:-1] == level[:,1:]) &
+                   active[:,:-1] & active[:,1:])
+        return np.any(overlap, axis=1)
+
+    def objects(self, episode):
+        """ present objects of one episode, rows of [level, pos, length, speed]
+            as used by frogger.sense_OWO and sense_MWO """
+        active = self.active[episode]
+        return np.array((self.level[episode, active], self.pos[episode, active],
+                         self.length[episode, active],
+                         self.speed[episode, active])).T
+
+
+if __name__ == '__main__':
+    import time
+    n_episodes = 1000
+    nsteps = 2000
+    highway = Highway(n_episodes, rng=np.random.RandomState(0))
+    n_objects = np.zeros(n_episodes, dtype=int)
+    collided = np.zeros(n_episodes, dtype=bool)
+    starttime = time.time()
+    for step in range(nsteps):
+        n_objects += highway.step()
+        collided |= highway.collisions()
+    print("{:d} steps of {:d} episodes in {:.2f} s".format(nsteps, n_episodes,
+                                                      time.time()-starttime))
+    print("objects per episode {:.1f}, episodes with collision {:d}".format(
+                                np.mean(n_objects), np.sum(collided)))
@@ -0,0 +1,380 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+the particle filter with MB from froggerMWO, froggerOWOev, and froggerOWOgrid
+as a class, so it can be stepped by any loop
+samples are [pos, length, speed], each level (lane) has its own samples
+ids = index of the first sample of each object, with nsamples at the end
+the three trackers differ only in how they handle occlusion, which is given by
+an occlusion model:
+    MWO - measurement-wise occlusion, from the measurements of nearer levels
+    OWOev - object-wise occlusion, from the expected value of nearer objects
+    OWOgrid - object-wise occlusion, from a grid on the sensor's angles
+each step, start() is called, then occlude() for each level from nearest to
+farthest, returning the probability that each sample creates a measurement
+and the probability that it is detected (these are different for MWO)
+
+tracker = Tracker(MWO())
+for step in range(nsteps):
+    reported_objects = tracker.step(sim.sense_MWO(objects))
+"""
+import os, sys
+import numpy as np
+from scipy.special import ndtr
+import frogger as sim
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from mwocommon import association
+import resampling
+
+noise_std = sim.pos_noise_std+.1 # add a little tolerance
+noise_precision_term = -.5 / noise_std**2
+const = (np.pi*2)**-.5 / noise_std
+# std of noise added to each resampled sample
+resample_stds = np.array([.3,.1,sim.speed_walk_std+.02])
+# object-measurement pairs less likely than this are not associated
+jam_gate = 1e-6
+
+def predict(samples):
+    samples[:,0] += samples[:,2]
+
+def survival(samples):
+    return np.where(np.abs(samples[:,0])-samples[:,1]<sim.road_len, .995, .05)
+
+def update(leftend, rightend, msmts):
+    """ likelihood of each measurement (columns) for each sample (rows) """
+    ll = np.empty((leftend.shape[0], msmts.shape[0]))
+    for end, visible, lower, upper in ((leftend, 1, 2, 3),
+                                       (rightend, 4, 5, 6)):
+        included = msmts[:,visible] > 0 # corner included
+        dev = msmts[:,lower] - end[:,None]
+        ll_end = np.where(included, np.exp(dev**2 * noise_precision_term) * const,
+                          ndtr((msmts[:,upper] - end[:,None])/noise_std) -
+                          ndtr(dev/noise_std))
+        if visible == 1:
+            ll[:] = ll_end
+        else:
+            ll *= ll_end
+    return ll
+
+def report(samples, ids, weights, min_report = .5):
+    """ weighted mean of each object that exists with probability min_report """
+    if len(ids) == 1:
+        return []
+    exist = np.add.reduceat(weights, ids[:-1])
+    means = np.add.reduceat(samples*weights[:,None], ids[:-1], axis=0)
+    reported = exist >= min_report
+    return list(means[reported] / exist[reported,None])
+
+
+class MWO():
+    """ measurement-wise occlusion: the occluded zones are the parts of the
+        nearer levels that are covered by measurements, a sample is blocked if
+        its measurement would lie strictly within one """
+    def start(self):
+        self.edges = []
+
+    def occlude(self, level, leftend, rightend, weights, ids, measurements,
+                detect_prob):
+        cross_len = sim.crossing_len * (level+1)
+        # update occlusion list
+        # this is fairly easy b.c. the measurements were generated the same way
+        if level > 0:
+            edges = [edge * cross_len/sim.crossing_len/level
+                     for edge in self.edges]
+        else:
+            edges = []
+        new_edges = list(edges)
+        for msmt_level, left_visible, left_lower, left_upper,\
+            right_visible, right_lower, right_upper in measurements:
+            left_edge, right_edge = np.searchsorted(new_edges,
+                                                    [left_lower, right_upper])
+            additions = []
+            if left_edge % 2 == 0:
+                additions += [left_lower]
+            if right_edge % 2 == 0:
+                additions += [right_lower]
+            new_edges = new_edges[:left_edge] + additions + new_edges[right_edge:]
+            assert len(new_edges)%2 == 0
+        self.edges = new_edges
+        # determine block probability
+        edges = np.reshape(edges, (-1,2))
+        notblock = 1 - np.sum(ndtr((leftend[:,None]-edges[:,0])/noise_std) *
+                              ndtr((edges[:,1]-rightend[:,None])/noise_std),
+                              axis=1)
+        return detect_prob, detect_prob * notblock
+
+
+class OWOev():
+    """ object-wise occlusion by the expected value of each nearer object
+        slight modification of Granstrom 2012 """
+    def __init__(self, sharpness=3., min_detect_prob=1e-2):
+        self.sharpness = sharpness
+        self.min_detect_prob = min_detect_prob
+
+    def start(self):
+        self.front_objects = []
+
+    def occlude(self, level, leftend, rightend, weights, ids, measurements,
+                detect_prob):
+        cross_len = sim.crossing_len * (level+1)
+        leftangle = leftend/cross_len
+        rightangle = rightend/cross_len
+        # bc they have PhD filter, they can use every sample instead of exp val
+        for front_exist, left_front, right_front in self.front_objects:
+            left_dev = np.minimum(left_front - leftangle, 0)
+            right_dev = np.minimum(rightangle - right_front, 0)
+            occlude_ll = (1 - np.exp(left_dev*self.sharpness))*\
+                         (1 - np.exp(right_dev*self.sharpness))
+            detect_prob = detect_prob * (1 - front_exist*occlude_ll)
+        detect_prob = np.maximum(detect_prob, self.min_detect_prob)
+        # update list of occluding objects
+        # could update this after filtering...
+        # but that would be less like normal tracking problem
+        if len(ids) > 1:
+            exist = np.add.reduceat(weights, ids[:-1])
+            left_obj = np.add.reduceat(weights*leftangle, ids[:-1]) / exist
+            right_obj = np.add.reduceat(weights*rightangle, ids[:-1]) / exist
+            assert not np.any(np.isnan(left_obj) | np.isnan(right_obj) |
+                              np.isnan(exist))
+            self.front_objects += list(zip(exist, left_obj, right_obj))
+        return detect_prob, detect_prob
+
+
+class OWOgrid():
+    """ object-wise occlusion from a grid on the angles of the sensor
+        each cell has a probability of being open, a sample's detection
+        probability is the highest open probability of the cells it covers """
+    def __init__(self, grid_res = 101):
+        grid_maxlen = (sim.road_len+6)/sim.crossing_len/2 + .5
+        self.grid = np.linspace(-grid_maxlen, grid_maxlen, grid_res)
+
+    def start(self):
+        self.grid_open = np.ones(self.grid.shape) # probability of being open
+
+    def occlude(self, level, leftend, rightend, weights, ids, measurements,
+                detect_prob):
+        cross_len = sim.crossing_len * (level+1)
+        ncells = self.grid.shape[0]
+        # each sample covers the cells strictly between its ends
+        first = np.searchsorted(self.grid, leftend/cross_len, 'right')
+        last = np.searchsorted(self.grid, rightend/cross_len, 'left')
+        covers = first < last
+        if level > 0:
+            # max_open[i,j] = highest open probability of cells i to j
+            max_open = np.where(np.triu(np.ones((ncells,ncells), dtype=bool)),
+                                self.grid_open[None,:], 0.)
+            max_open = np.maximum.accumulate(max_open, axis=1)
+            min_open = np.zeros(detect_prob.shape)
+            min_open[covers] = max_open[first[covers], last[covers]-1]
+            detect_prob = detect_prob * min_open
+        # correct thing to do is partition by objects
+        # product across objects ( 1-occlusion )
+        # but we're already failing to assume that objects don't overlap
+        cover_weight = np.cumsum(np.bincount(first[covers], weights[covers],
+                                             minlength=ncells+1) -
+                                 np.bincount(last[covers], weights[covers],
+                                             minlength=ncells+1))
+        self.grid_open *= np.maximum(1 - cover_weight[:ncells], 0)
+        return detect_prob, detect_prob
+
+
+class Tracker():
+    """ track-oriented multi-bernoulli filter, one set of samples per level
+        occlusion = MWO(), OWOev(), or OWOgrid()
+        rng = generator for resampling and births
+        resample_method = 'systematic', 'stratified', or 'residual'
+        ess_threshold = a level is only resampled when its effective sample
+            size is below this fraction of nsamples, None to always resample
+            (either way, a level is not resampled while its entrance is
+            covered by birth samples) """
+    def __init__(self, occlusion, nsamples = 4096, birth_rate = .15,
+                 rng = np.random, resample_method = 'systematic',
+                 ess_threshold = None):
+        self.occlusion = occlusion
+        self.nsamples = nsamples
+        self.birth_rate = birth_rate
+        self.rng = rng
+        self.resample_method = resample_method
+        self.ess_threshold = ess_threshold
+        self.samples = [np.zeros((nsamples, 3)) for level in range(sim.n_levels)]
+        self.weights = [np.zeros((nsamples,)) for level in range(sim.n_levels)]
+        self.ids = [np.array([nsamples]) for level in range(sim.n_levels)]
+        # resampled samples are written here, then swapped with samples
+        self._spare = [np.zeros((nsamples, 3)) for level in range(sim.n_levels)]
+        self._index = np.zeros((nsamples,), dtype=int)
+        # effective sample size of each level at the last step, before
+        # resampling, and whether it was resampled
+        self.ess = np.zeros((sim.n_levels,))
+        self.resampled = np.zeros((sim.n_levels,), dtype=bool)
+        # number of DA_JAM iterations for each assignment
+        self.jam_iterations = []
+
+    def _resample(self, level):
+        """ resampling and birth """
+        nsamples = self.nsamples
+        samples = self.samples[level]
+        weights = self.weights[level]
+        ids = self.ids[level]
+        direction = 1. if level < sim.n_levels_left else -1
+        cardinality = np.sum(weights)
+        old_obj_cutoff = cardinality / (cardinality + self.birth_rate)
+        n_old_objs = int(old_obj_cutoff * nsamples)
+        index = self._index[:n_old_objs]
+        if n_old_objs > 0:
+            if self.resample_method == 'systematic':
+                resampling.systematic(weights, self.rng.random_sample(), index)
+            else:
+                getattr(resampling, self.resample_method)(weights,
+                                    self.rng.random_sample(n_old_objs), index)
+        ids = np.unique(np.searchsorted(index, ids, 'left'))
+        new_samples = self._spare[level]
+        np.take(samples, index, axis=0, out=new_samples[:n_old_objs])
+        new_samples[:n_old_objs] += self.rng.normal(size=(n_old_objs,3)) *\
+                                    resample_stds
+        new_samples[n_old_objs:] = self.rng.uniform(
+                                    [0.,sim.min_car_len, sim.min_car_speed],
+                                    [5.,sim.max_car_len, sim.max_car_speed],
+                                    size=(nsamples-n_old_objs,3))
+        if direction > 0:
+            new_samples[n_old_objs:,0] -= sim.road_len
+        else:
+            new_samples[n_old_objs:,0] += sim.road_len-4
+            new_samples[n_old_objs:,2] *= -1
+        weights[:] = (cardinality+self.birth_rate) / nsamples
+        if n_old_objs < nsamples:
+            ids = np.append(ids, [nsamples])
+        # discretization might make an object existence >= 1
+        # this will break the system, so push it down
+        exist = np.add.reduceat(weights, ids[:-1])
+        correction = np.minimum(1, (1-1e-8)/exist)
+        weights *= np.repeat(correction, np.diff(ids))
+        assert not np.any(np.isnan(weights))
+        self._spare[level] = samples
+        self.samples[level] = new_samples
+        self.ids[level] = ids
+
+    def step(self, all_measurements):
+        """ all_measurements = rows of [level, left visible, left lower,
+                left upper, right visible, right lower, right upper],
+                as from frogger.sense_MWO or sense_OWO
+            returns the estimated [level, pos, length, speed] of each object
+            that probably exists """
+        all_measurements = np.asarray(all_measurements, dtype=float)
+        all_measurements = all_measurements.reshape((-1,7))
+        self.occlusion.start()
+        for level in range(sim.n_levels):
+            samples = self.samples[level]
+            weights = self.weights[level]
+            predict(samples)
+            weights *= survival(samples)
+            measurements = all_measurements[all_measurements[:,0]==level]
+            direction = 1. if level < sim.n_levels_left else -1
+
+            entrance_covered = np.sum(weights[
+                        -samples[:,0]*direction+samples[:,1] > sim.road_len])
+            self.ess[level] = resampling.ess(weights)
+            self.resampled[level] = entrance_covered < .3 and (
+                        self.ess_threshold is None or
+                        self.ess[level] < self.ess_threshold * self.nsamples)
+            if self.resampled[level]:
+                self._resample(level)
+                samples = self.samples[level]
+            ids = self.ids[level]
+
+            leftend, rightend = sim.getLR(samples[:,0], samples[:,1],
+                                          samples[:,2])
+            detect_prob = np.zeros(weights.shape) + sim.detect_prob * .99
+            msmt_prob, detect_prob = self.occlusion.occlude(level, leftend,
+                                rightend, weights, ids, measurements,
+                                detect_prob)
+
+            # can leave here if you're not filtering
+            if len(ids) == 1 or len(measurements) == 0:
+                continue
+
+            # find object-measurement correspondence
+            sample_DE = weights * msmt_prob
+            sample_msmt = update(leftend, rightend, measurements)
+            sample_msmt *= sample_DE[:,None]
+            sample_detect = weights * detect_prob
+
+            # aggregate by object
+            obj_miss = 1 - np.add.reduceat(sample_detect, ids[:-1])
+            obj_msmt = np.add.reduceat(sample_msmt, ids[:-1], axis=0)
+
+            # likelihood of false positives
+            miss_msmt = (np.where(measurements[:,1] > 0, 1.,
+                                  measurements[:,3]-measurements[:,2]) *
+                         np.where(measurements[:,4] > 0, 1.,
+                                  measurements[:,6]-measurements[:,5]))
+            miss_msmt *= sim.fp_rate/sim.n_levels*1.1/(sim.road_len*2)**2
+
+            # assignment
+            jam_object_msmt, jam_object_miss, _, _, iterations = \
+                        association.DA_JAM(obj_msmt, obj_miss, miss_msmt,
+                                           gate=jam_gate)
+            self.jam_iterations.append(iterations)
+            match_object_msmt = np.divide(jam_object_msmt, obj_msmt,
+                                          out=np.zeros(obj_msmt.shape),
+                                          where=obj_msmt > 1e-30)
+            match_object_miss = np.divide(jam_object_miss, obj_miss,
+                                          out=np.zeros(obj_miss.shape),
+                                          where=obj_miss > 1e-30)
+            # filtering - so easy for particles
+            counts = np.diff(ids)
+            sample_msmt *= np.repeat(match_object_msmt, counts, axis=0)
+            match_sample_filter = np.sum(sample_msmt, axis=1) # prob of any match
+            match_sample_miss = (weights - sample_detect) *\
+                                np.repeat(match_object_miss, counts)
+            assert not np.any(np.isnan(match_sample_filter + match_sample_miss))
+            weights[:] = match_sample_filter + match_sample_miss
+
+        return [(level, pos, length, speed) for level in range(sim.n_levels)
+                for pos, length, speed in report(self.samples[level],
+                                                 self.ids[level],
+                                                 self.weights[level])]
+
+
+def drawTracking(objects, reported_objects, measurements):
+    """ image of real objects (black), estimates (red), and measurements """
+    im = sim.im.copy()
+    for level, pos, length, speed in objects:
+        left, right = sim.getLR(pos, length, speed)
+        if left > sim.road_len or right < -sim.road_len: continue
+        left = max(0, int(left*sim.ppm + sim.n_horz_pixels/2))
+        right = min(sim.n_horz_pixels, int(right*sim.ppm + sim.n_horz_pixels/2))
+        top = int((sim.n_levels - level - .1)*sim.crossing_len*sim.ppm)
+        bottom = int((sim.n_levels - level + .1)*sim.crossing_len*sim.ppm)
+        sim.drawBox2D(top,left,bottom,right, im, color=[0,0,0])
+    # plot estimated objects
+    for level, pos, length, speed in reported_objects:
+        left, right = sim.getLR(pos, length, speed)
+        if left > sim.road_len or right < -sim.road_len: continue
+        left = max(0, int(left*sim.ppm + sim.n_horz_pixels/2))
+        right = min(sim.n_horz_pixels, int(right*sim.ppm + sim.n_horz_pixels/2))
+        top = int((sim.n_levels - level - .3)*sim.crossing_len*sim.ppm)
+        bottom = int((sim.n_levels - level + .3)*sim.crossing_len*sim.ppm)
+        sim.drawBox2D(top,left,bottom,right, im, color=[250,50,50],linewidth=1)
+    # plot measurements
+    for level, vis_left, left, left2, vis_right, right, right2 in measurements:
+        left = max(0, int(left*sim.ppm + sim.n_horz_pixels/2))
+        left2 = max(0, int(left2*sim.ppm + sim.n_horz_pixels/2))
+        right = min(sim.n_horz_pixels, int(right*sim.ppm + sim.n_horz_pixels/2))
+        right2 = min(sim.n_horz_pixels, int(right2*sim.ppm + sim.n_horz_pixels/2))
+        if vis_right: assert right == right2
+        if left >= sim.n_horz_pixels or right2 < 0 or right2<left: continue
+        top = int((sim.n_levels - level - .2)*sim.crossing_len*sim.ppm)
+        bottom = int((sim.n_levels - level + .2)*sim.crossing_len*sim.ppm)
+        if vis_left > 0 and vis_right > 0:
+            sim.drawBox2D(top, left, bottom, right, im, color=[10,10,255], linewidth=0)
+        elif vis_left > 0:
+            sim.drawBox2D(top, left, bottom, right2, im, color=[10,10,255],linewidth=0,
+                      sides_to_include=[False,True,True,False])
+        elif vis_right > 0:
+            sim.drawBox2D(top, left, bottom, right2, im, color=[10,10,255],linewidth=0,
+                      sides_to_include=[False,False,True,True])
+        else:
+            sim.drawBox2D(top, left, bottom, right2, im, color=[10,10,255],linewidth=0,
+                      sides_to_include=[False,False,True,False])
+    return im
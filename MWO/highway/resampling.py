@@ -0,0 +1,111 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+resampling for the particle filters, compiled with numba
+each method fills a preallocated index buffer with the indices of the chosen
+samples, in increasing order, and works in one pass over the weights (no
+cumulative sum array or searchsorted)
+the weights don't need to be normalized
+
+index = np.empty((nsamples,), dtype=int)
+if ess(weights) < nsamples/2:
+    systematic(weights, np.random.random_sample(), index)
+    samples = samples[index]
+"""
+import numpy as np
+import numba as nb
+
+@nb.jit(nopython=True)
+def ess(weights):
+    """ effective sample size, 1/sum(normalized weights^2) """
+    total = 0.
+    squares = 0.
+    for weight in weights:
+        total += weight
+        squares += weight*weight
+    if squares == 0:
+        return 0.
+    return total*total / squares
+
+@nb.jit(nopython=True)
+def systematic(weights, u, out):
+    """ one uniform draw u in [0,1), positions spaced evenly from u/n """
+    n = out.shape[0]
+    scale = n / np.sum(weights)
+    idx = 0
+    cumulative = weights[0] * scale
+    for k in range(n):
+        position = u + k
+        while position >= cumulative and idx < weights.shape[0]-1:
+            idx += 1
+            cumulative += weights[idx] * scale
+        out[k] = idx
+
+@nb.jit(nopython=True)
+def stratified(weights, u, out):
+    """ u = array of uniform draws in [0,1), one for each entry of out """
+    n = out.shape[0]
+    scale = n / np.sum(weights)
+    idx = 0
+    cumulative = weights[0] * scale
+    for k in range(n):
+        position = u[k] + k
+        while position >= cumulative and idx < weights.shape[0]-1:
+            idx += 1
+            cumulative += weights[idx] * scale
+        out[k] = idx
+
+@nb.jit(nopython=True)
+def residual(weights, u, out):
+    """ each sample is copied floor(n*normalized weight) times, the rest of
+        out is filled by stratified resampling of the remaining weights
+        u = array of uniform draws in [0,1), one for each entry of out
+        (only the first n - copies are used) """
+    n = out.shape[0]
+    total = np.sum(weights)
+    remainder = np.empty(weights.shape[0])
+    ncopied = 0
+    for idx in range(weights.shape[0]):
+        expected = weights[idx] / total * n
+        copies = int(np.floor(expected))
+        remainder[idx] = expected - copies
+        ncopied += copies
+    nresidual = n - ncopied
+    residual_index = out[ncopied:]
+    if nresidual > 0:
+        stratified(remainder, u[:nresidual], residual_index)
+    # merge the copies and the residual draws, keeping the order
+    residual_index = residual_index.copy()
+    k = 0
+    r = 0
+    for idx in range(weights.shape[0]):
+        copies = int(np.floor(weights[idx] / total * n))
+        for c in range(copies):
+            out[k] = idx
+            k += 1
+        while r < nresidual and residual_index[r] == idx:
+            out[k] = idx
+            k += 1
+            r += 1
+
+
+if __name__ == '__main__':
+    # residual keeps the floor copies but otherwise draws independently, so
+    # it shouldn't give the same indices as systematic with the same weights
+    rng = np.random.RandomState(0)
+    n = 64
+    systematic_index = np.empty((n,), dtype=int)
+    residual_index = np.empty((n,), dtype=int)
+    ndiffer = 0
+    for trial in range(1000):
+        weights = rng.exponential(size=30)
+        u = rng.random_sample(n)
+        systematic(weights, u[0], systematic_index)
+        residual(weights, u, residual_index)
+        counts = np.bincount(residual_index, minlength=30)
+        assert np.all(counts >= np.floor(weights / np.sum(weights) * n))
+        assert np.all(np.diff(residual_index) >= 0)
+        ndiffer += np.any(residual_index != systematic_index)
+    print("residual differs from systematic in {:d} of 1000 trials".format(
+                                                                    ndiffer))
+    assert ndiffer > 0
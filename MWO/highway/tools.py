@@ -3,16 +3,26 @@
 """
 last mod 2/26/18
 """
+import os, sys
 import numpy as np
 import scipy.optimize as spopt
 from scipy.stats import norm as spnorm
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from mwocommon import scoring
 
-def _euclideanDist(X, Y): return np.linalg.norm(X-Y, 2)
+# cost functions broadcast over leading dimensions, so they give the cost
+# between two states, or the matrix of costs when called with X[:,None], Y[None]
+def _euclideanDist(X, Y): return np.linalg.norm(X-Y, 2, axis=-1)
 
 def froggerDist(X, Y):
-    if X[0] == Y[0]:
-        return np.sqrt((X[1] - Y[1])**2 + (X[2] - Y[2])**2)
-    return np.inf
+    return np.where(X[...,0] == Y[...,0],
+                    np.hypot(X[...,1] - Y[...,1], X[...,2] - Y[...,2]), np.inf)
+
+def _costs(X, Y, p, c, costFun):
+    X = np.asarray(X, dtype=float).reshape((len(X), -1))
+    Y = np.asarray(Y, dtype=float).reshape((len(Y), -1))
+    return np.minimum(costFun(X[:,None], Y[None,:]), c) ** p
 
 # standard way to score tracking
 def OSPA(X, Y, p=1, c=100, costFun = _euclideanDist):
@@ -22,8 +32,7 @@ def OSPA(X, Y, p=1, c=100, costFun = _euclideanDist):
         return OSPA(Y, X, p, c, costFun)
     if m == 0:
         return 0 if n==0 else c
-    costs = np.array([[costFun(Xi , Yj) for Yj in Y] for Xi in X])
-    costs = np.minimum(costs, c) ** p
+    costs = _costs(X, Y, p, c, costFun)
     row_ind, col_ind = spopt.linear_sum_assignment(costs)
     score = np.sum(costs[row_ind, col_ind]) + c**p * (n-m)
     return (score/n)**(1./p)
@@ -37,10 +46,13 @@ def GOSPA(X, Y, p=1, c=100, costFun = _euclideanDist):
         return GOSPA(Y, X, p, c, costFun)
     if m == 0:
         return c**p / 2. * n
-    costs = np.array([[costFun(Xi , Yj) for Yj in Y] for Xi in X])
-    costs = np.minimum(costs, c) ** p
+    costs = _costs(X, Y, p, c, costFun)
     row_ind, col_ind = spopt.linear_sum_assignment(costs)
     return np.sum(costs[row_ind, col_ind]) + c**p / 2. * (n-m)
+
+def scoreFrames(Xs, Ys, metric=GOSPA, nworkers=1, **kwargs):
+    """ metric (OSPA or GOSPA) of each frame, see mwocommon/scoring.py """
+    return scoring.scoreFrames(Xs, Ys, metric, nworkers, **kwargs)
     
 # did this myself - like RMS over time
 def normalizeGOSPA(ospas, ns, smoothval, p=1):
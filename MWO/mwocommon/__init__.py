@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+code shared by the highway and pedestrian trackers
+the scripts in each folder put MWO/ on the path to import it:
+    from mwocommon import association
+"""
@@ -0,0 +1,148 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+data association approximation (DA_JAM), loopy belief propagation between
+objects and measurements, compiled with numba
+used by both the highway and pedestrian trackers
+
+messages are kept as logs, and the sum of all other messages in a row or column
+is found from prefix and suffix sums instead of by subtracting from the total,
+so tiny or huge likelihoods don't lose precision
+iteration stops once no message changes by more than tol (relative), which
+usually takes tens of iterations rather than the fixed 1000 used before
+messages can be returned and given back as a warm start, for instance when
+the likelihoods are recalculated for the same objects and measurements
+(the measurements change every frame, so there is no warm start between frames)
+
+with a gate, unlikely pairs are dropped and the problem splits into small
+groups of objects and measurements that don't compete with each other, which
+are solved one at a time
+"""
+import numpy as np
+import numba as nb
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+@nb.jit(nopython=True)
+def _exclusiveLogSum(values, extra, out):
+    """ out[k] = log(exp(extra) + sum of exp(values) except values[k]) """
+    n = values.shape[0]
+    top = extra
+    for k in range(n):
+        if values[k] > top:
+            top = values[k]
+    if top == -np.inf:
+        out[:] = -np.inf
+        return
+    prefix = np.exp(extra - top)
+    for k in range(n):
+        out[k] = prefix
+        prefix += np.exp(values[k] - top)
+    suffix = 0.
+    for k in range(n-1, -1, -1):
+        out[k] = np.log(out[k] + suffix) + top
+        suffix += np.exp(values[k] - top)
+
+@nb.jit(nopython=True)
+def _jam(log_msmt, log_miss, log_fp, m, tol, max_iterations):
+    """ updates the log messages m in place, returns the iteration count """
+    nobjects, nmsmts = log_msmt.shape
+    excl_row = np.empty(nmsmts)
+    excl_col = np.empty(nobjects)
+    column = np.empty(nobjects)
+    previous = m.copy()
+    iteration = 0
+    while iteration < max_iterations:
+        iteration += 1
+        # row half
+        for i in range(nobjects):
+            _exclusiveLogSum(m[i], log_miss[i], excl_row)
+            for j in range(nmsmts):
+                m[i,j] = log_msmt[i,j] - excl_row[j]
+        # column half
+        change = 0.
+        for j in range(nmsmts):
+            for i in range(nobjects):
+                column[i] = m[i,j]
+            _exclusiveLogSum(column, log_fp[j], excl_col)
+            for i in range(nobjects):
+                new = log_msmt[i,j] - excl_col[i]
+                if new > -np.inf:
+                    change = max(change, abs(new - previous[i,j]))
+                previous[i,j] = new
+                m[i,j] = new
+        if change < tol:
+            break
+    return iteration
+
+def components(object_msmt, object_miss, miss_msmt, gate):
+    """
+    splits the objects and measurements into groups that can be associated
+    separately, pairs whose match probability is surely below gate are cut
+    (match prob <= object_msmt / (object_miss * miss_msmt))
+    returns the group of each object and of each measurement, the number of
+    groups, and which pairs were kept
+    """
+    nobjects, nmsmts = object_msmt.shape
+    gated = object_msmt > gate * object_miss[:,None] * miss_msmt[None,:]
+    objs, msmts = np.nonzero(gated)
+    graph = coo_matrix((np.ones(objs.shape[0]), (objs, msmts + nobjects)),
+                       shape=(nobjects+nmsmts, nobjects+nmsmts))
+    ngroups, labels = connected_components(graph, directed=False)
+    return labels[:nobjects], labels[nobjects:], ngroups, gated
+
+def DA_JAM(object_msmt, object_miss, miss_msmt, messages=None, tol=1e-6,
+           max_iterations=1000, gate=None):
+    """
+    object_msmt = likelihood of each object creating each measurement
+    object_miss = likelihood of each object not creating any measurement
+    miss_msmt = likelihood of each measurement being a false positive
+    messages = messages returned by an earlier call with the same objects and
+               measurements, to start from, or None
+    gate = if given, objects and measurements are split into groups that are
+           only linked by pairs with match probability below gate, and
+           each group is solved separately, see components()
+    returns the probability of each object-measurement match, of each object
+    not matching, of each measurement not matching, the messages, and the
+    number of iterations (the most of any group)
+    """
+    object_msmt = np.asarray(object_msmt, dtype=float)
+    object_miss = np.asarray(object_miss, dtype=float)
+    miss_msmt = np.asarray(miss_msmt, dtype=float)
+    if messages is None:
+        messages = object_msmt
+    with np.errstate(divide='ignore'):
+        log_msmt = np.log(object_msmt)
+        log_miss = np.log(object_miss)
+        log_fp = np.log(miss_msmt)
+        m = np.log(messages)
+    if gate is None:
+        iterations = _jam(log_msmt, log_miss, log_fp, m, tol, max_iterations)
+    else:
+        obj_groups, msmt_groups, ngroups, gated = components(object_msmt,
+                                            object_miss, miss_msmt, gate)
+        m[~gated] = -np.inf
+        obj_order = np.argsort(obj_groups, kind='mergesort')
+        msmt_order = np.argsort(msmt_groups, kind='mergesort')
+        obj_splits = np.searchsorted(obj_groups[obj_order], np.arange(ngroups+1))
+        msmt_splits = np.searchsorted(msmt_groups[msmt_order],
+                                      np.arange(ngroups+1))
+        iterations = 0
+        for group in range(ngroups):
+            msmts = msmt_order[msmt_splits[group]:msmt_splits[group+1]]
+            if msmts.shape[0] == 0:
+                continue # lone object
+            objs = obj_order[obj_splits[group]:obj_splits[group+1]]
+            block = np.ix_(objs, msmts)
+            m_group = m[block]
+            iterations = max(iterations, _jam(log_msmt[block], log_miss[objs],
+                                              log_fp[msmts], m_group, tol,
+                                              max_iterations))
+            m[block] = m_group
+    log_rowsum = log_miss.copy()
+    for j in range(m.shape[1]):
+        log_rowsum = np.logaddexp(log_rowsum, m[:,j])
+    log_rowsum[log_rowsum == -np.inf] = 0. # object can't exist
+    match = np.exp(m - log_rowsum[:,None])
+    return (match, np.exp(log_miss - log_rowsum), 1 - np.sum(match, axis=0),
+            np.exp(m), iterations)
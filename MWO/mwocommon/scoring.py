@@ -0,0 +1,30 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+scores many frames at once, optionally split across processes
+used with highway/tools.GOSPA and pedestrian/gospa.GOSPA
+"""
+import numpy as np
+
+def _scoreFrames(args):
+    metric, Xs, Ys, kwargs = args
+    return [metric(X, Y, **kwargs) for X, Y in zip(Xs, Ys)]
+
+def scoreFrames(Xs, Ys, metric, nworkers=1, **kwargs):
+    """ metric (such as OSPA or GOSPA) of each frame, Xs and Ys are lists of
+        frames, kwargs are passed to metric
+        metric and any function in kwargs (costFun) must be module-level
+        if nworkers > 1, the frames are split into chunks for a process pool """
+    Xs = list(Xs)
+    Ys = list(Ys)
+    if nworkers == 1 or len(Xs) == 0:
+        return np.array(_scoreFrames((metric, Xs, Ys, kwargs)))
+    from multiprocessing import Pool
+    chunk = -(-len(Xs) // (nworkers*4))
+    tasks = [(metric, Xs[k:k+chunk], Ys[k:k+chunk], kwargs)
+             for k in range(0, len(Xs), chunk)]
+    pool = Pool(nworkers)
+    scores = pool.map(_scoreFrames, tasks)
+    pool.close()
+    pool.join()
+    return np.array([score for chunk_scores in scores for score in chunk_scores])
@@ -0,0 +1,46 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+statistics of a sequence's detections, which trackmodel's parameters are based on
+they are computed once per sequence and cached as stats.json in its folder,
+along with a version number, so a change to estimate() is noticed and the
+cache recomputed
+
+stats = datasetStats.load('MOT17-04-FRCNN')
+trackmodel.configure(stats)
+"""
+import os
+import json
+import numpy as np
+
+version = 1
+root_folder = 'train/'
+
+def estimate(data):
+    """ data = rows of det.txt (frame, left, top, width, height, confidence) """
+    return {'minx' : float(np.min(data[:,1])),
+            'maxx' : float(np.max(data[:,1]+data[:,3])),
+            'miny' : float(np.min(data[:,2])),
+            'maxy' : float(np.max(data[:,2]+data[:,4])),
+            'avgwidth' : float(np.mean(data[:,3]) / 2.),
+            'avgheight' : float(np.mean(data[:,4]) / 2.),
+            'stdwidth' : float(np.std(data[:,3]) / 2.),
+            'stdheight' : float(np.std(data[:,4]) / 2.),
+            'imshape_corr' : float(np.corrcoef(data[:,3], data[:,4])[0][1]),
+            'avg_num_msmts' : float(data.shape[0]) /
+                              (data[-1,0] - data[0,0] + 1)}
+
+def load(sequence, root=root_folder, recompute=False):
+    """ statistics of root/sequence/det.txt, from the cache if it's current """
+    folder = os.path.join(root, sequence)
+    cache_file = os.path.join(folder, 'stats.json')
+    if not recompute and os.path.exists(cache_file):
+        with open(cache_file) as fileobj:
+            stats = json.load(fileobj)
+        if stats.get('version') == version:
+            return stats
+    stats = estimate(np.loadtxt(os.path.join(folder, 'det.txt'), delimiter=','))
+    stats['version'] = version
+    with open(cache_file, 'w') as fileobj:
+        json.dump(stats, fileobj, indent=1, sort_keys=True)
+    return stats
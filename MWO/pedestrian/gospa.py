@@ -3,21 +3,29 @@
 """
 last mod 5/17/18
 """
+import os, sys
 import scipy.optimize as spopt
 import numpy as np
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from mwocommon import scoring
 
+# boxes are [left, top, width, height], these broadcast over leading
+# dimensions, so a and b can be single boxes or a[:,None] and b[None]
 def overlap(a, b):
-    xdiff = a[0]-b[0]
-    ydiff = a[1]-b[1]
-    return b[2] > xdiff and a[2] > -xdiff and b[3] > ydiff and a[3] > -ydiff
+    xdiff = a[...,0]-b[...,0]
+    ydiff = a[...,1]-b[...,1]
+    return (b[...,2] > xdiff) & (a[...,2] > -xdiff) &\
+           (b[...,3] > ydiff) & (a[...,3] > -ydiff)
 
 def IoU(a, b):
-    if not overlap(a,b): return 0
-    areaA = a[2]*a[3]
-    areaB = b[2]*b[3]
-    I = (min(a[0]+a[2], b[0]+b[2]) - max(a[0], b[0])) *\
-        (min(a[1]+a[3], b[1]+b[3]) - max(a[1], b[1]))
-    return I / (areaA + areaB - I)
+    areaA = a[...,2]*a[...,3]
+    areaB = b[...,2]*b[...,3]
+    I = (np.minimum(a[...,0]+a[...,2], b[...,0]+b[...,2]) -
+         np.maximum(a[...,0], b[...,0])) *\
+        (np.minimum(a[...,1]+a[...,3], b[...,1]+b[...,3]) -
+         np.maximum(a[...,1], b[...,1]))
+    return np.where(overlap(a,b), I / (areaA + areaB - I), 0.)
 
 def minusIoU(a, b): return 1 - IoU(a, b)
 
@@ -28,7 +36,12 @@ def GOSPA(X, Y, p=1, c=1., costFun = minusIoU):
         return GOSPA(Y, X, p, c, costFun)
     if m == 0:
         return c**p / 2. * n
-    costs = np.array([[costFun(Xi , Yj) for Yj in Y] for Xi in X])
-    costs = np.minimum(costs, c) ** p
+    X = np.asarray(X, dtype=float).reshape((m, -1))
+    Y = np.asarray(Y, dtype=float).reshape((n, -1))
+    costs = np.minimum(costFun(X[:,None], Y[None,:]), c) ** p
     row_ind, col_ind = spopt.linear_sum_assignment(costs)
-    return np.sum(costs[row_ind, col_ind]) + c**p / 2. * (n-m)
\ No newline at end of file
+    return np.sum(costs[row_ind, col_ind]) + c**p / 2. * (n-m)
+
+def scoreFrames(Xs, Ys, nworkers=1, **kwargs):
+    """ GOSPA of each frame, see mwocommon/scoring.py """
+    return scoring.scoreFrames(Xs, Ys, GOSPA, nworkers, **kwargs)
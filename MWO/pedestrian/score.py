@@ -6,7 +6,7 @@ last mod 5/17/18
 
 import numpy as np
 import motmetrics
-from gospa import GOSPA
+from gospa import scoreFrames
 
 truth_file = 'train/MOT17-04-FRCNN/gt.txt'
 estimate_file = 'detect_non.txt'
@@ -23,7 +23,8 @@ true_card = float(truth.shape[0])
 data_card = float(data.shape[0])
 
 mmacc = motmetrics.MOTAccumulator(auto_id=True)
-gospa = 0.
+frames_data = []
+frames_truth = []
 curr_idx_data = 0
 curr_idx_truth = 0
 for time in range(int(maxtime)+1):
@@ -37,7 +38,10 @@ for time in range(int(maxtime)+1):
     
     mmacc.update(X[:,1], Y[:,1], 
                  motmetrics.distances.iou_matrix(X[:,2:6], Y[:,2:6], 1.))
-    gospa += GOSPA(X[:,2:6], Y[:,2:6])
+    frames_data.append(X[:,2:6])
+    frames_truth.append(Y[:,2:6])
+
+gospa = np.sum(scoreFrames(frames_data, frames_truth))
 
 mh = motmetrics.metrics.create()
 summary = mh.compute(mmacc, metrics=['mota','motp','idf1','mostly_tracked','mostly_lost',
@@ -0,0 +1,300 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+the multi-bernoulli filter from track.py as a class, stepped one frame at a
+time, so detections can come from any source (file, pipe, socket) and each
+frame's tracks are available right away
+memory doesn't grow with the length of the sequence
+
+tracker = Tracker(stats=datasetStats.load('MOT17-04-FRCNN'))
+for frame, measurements in readMOT(open('det.txt')):
+    if frame % tm.skip: continue
+    reports, exist = tracker.step(measurements, frame)
+    reports[exist > .5] # [unique id, left, top, width, height]
+"""
+import os, sys
+import numpy as np
+import numba as nb
+from scipy.spatial import cKDTree
+import trackmodel as tm
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(__file__),
+                                              '..')))
+from mwocommon import association
+
+def readMOT(lines, ncolumns=6):
+    """ groups lines of a MOT-format text file (frame, ..., comma separated,
+        sorted by frame, frames starting at 1) by frame
+        yields (frame index from 0, array of the frame's rows), including
+        frames with no rows, as soon as the frame's rows have been read """
+    frame = 0
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if line == '':
+            continue
+        row = [float(value) for value in line.split(',')[:ncolumns]]
+        row_frame = int(row[0]) - 1
+        while row_frame > frame:
+            yield frame, np.array(rows).reshape((-1, ncolumns))
+            rows = []
+            frame += 1
+        rows.append(row)
+    yield frame, np.array(rows).reshape((-1, ncolumns))
+
+
+# sums over the samples of each object (ids[:,k] is True), in one pass
+@nb.jit(nopython=True)
+def objectSum(values, ids, out):
+    """ out[k] = sum of values[i] over samples i with ids[i,k] """
+    out[:] = 0.
+    for i in range(ids.shape[0]):
+        for k in range(ids.shape[1]):
+            if ids[i,k]:
+                out[k] += values[i]
+    return out
+
+@nb.jit(nopython=True)
+def objectMeans(samples, existences, ids, out):
+    """ out[k] = sum of samples[i]*existences[i] over samples i with ids[i,k] """
+    out[:] = 0.
+    for i in range(ids.shape[0]):
+        for k in range(ids.shape[1]):
+            if ids[i,k]:
+                for f in range(samples.shape[1]):
+                    out[k,f] += samples[i,f] * existences[i]
+    return out
+
+@nb.jit(nopython=True)
+def objectScale(ids, object_miss, object_msmt, out):
+    """ multiplies each sample's row of out by its object's [miss, msmts...] """
+    for i in range(ids.shape[0]):
+        for k in range(ids.shape[1]):
+            if ids[i,k]:
+                out[i,0] *= object_miss[k]
+                for j in range(object_msmt.shape[1]):
+                    out[i,j+1] *= object_msmt[k,j]
+    return out
+
+@nb.jit(nopython=True)
+def mergePairs(existences, rows, pairs):
+    """ for each pair, the first particle's existence goes to the second
+        pairs index into rows, which are the particles' indices """
+    for k in range(pairs.shape[0]):
+        merged = rows[pairs[k,0]]
+        kept = rows[pairs[k,1]]
+        existences[kept] += existences[merged]
+        existences[merged] = 0.
+    return existences
+
+# particles closer than 1 are pruned, the kd tree search is approximate and
+# can return pairs up to 2 apart, so objects are spaced further than that
+prune_object_spacing = 10.
+
+class Tracker():
+    """ track-oriented multi-bernoulli filter with a fixed number of samples
+        occlusion = "None", "MWO", or "OWO"
+        jam_gate = less likely object-measurement pairs are not associated
+        stats = dataset statistics from datasetStats, given to
+                trackmodel.configure, or None if it was already configured
+                (trackmodel holds one configuration per process) """
+    def __init__(self, nsamples = 2048, nobjects = 72, occlusion = "None",
+                 jam_gate = 1e-6, stats = None):
+        if stats is not None:
+            tm.configure(stats)
+        self.nsamples = nsamples
+        self.nobjects = nobjects
+        self.occlusion = occlusion
+        self.jam_gate = jam_gate
+        # two structures - will switch between these
+        self.samples = np.zeros((nsamples, tm.sample_nft)) + tm.initial_sample
+        self.existences = np.zeros((nsamples,))
+        self.existences[0] = tm.initial_cardinality
+        self.ids = np.zeros((nsamples, nobjects), dtype=bool)
+        self.new_samples = np.empty(self.samples.shape)
+        self.new_exist = np.empty(self.existences.shape)
+        self.new_ids = np.empty(self.ids.shape, dtype=bool)
+        # unique labels, because id columns will be reused
+        # assigned at first time object is recognized
+        self.unique_ids = np.zeros((nobjects,), dtype=int)
+        self.unique_id_count = 0
+        # number of DA_JAM iterations at the last step
+        self.jam_iterations = 0
+
+    def step(self, measurements, frame):
+        """ measurements = rows of [frame, left, top, width, height, confidence]
+            frame = index of the video frame, from 0
+            the motion model assumes steps are trackmodel.skip frames apart
+            returns [unique id, left, top, width, height] of every object slot,
+            and the existence probability of each """
+        nsamples = self.nsamples
+        nobjects = self.nobjects
+        samples = self.samples
+        existences = self.existences
+        ids = self.ids
+        new_samples = self.new_samples
+        new_exist = self.new_exist
+        new_ids = self.new_ids
+        unique_ids = self.unique_ids
+        n_measurements = len(measurements)
+
+        # predict
+        tm.predict(samples)
+        existences *= tm.survival(samples)
+        #tm.debug(samples[existences > 1e-10])
+
+        # entry
+        # so this is hacky... but given the limited number of components
+        # and the fact that they aren't easily merged, it is better to not
+        # include entry components every single time
+        # instead, add components every other time with twice the magnitude
+        # I should have made this clearer/added some hyperparameters to control
+        if frame % 2 == 0:
+            for entry_idx, entry_exist in enumerate(tm.entry_cardinality):
+                min_exist = np.argmin(existences)
+                if existences[min_exist] < entry_exist:
+                    samples[min_exist] = tm.entry_samples[entry_idx]
+                    ids[min_exist] = False
+                    existences[min_exist] = entry_exist
+
+        ## update
+        # false positive likelihood (with generation intensity included)
+        fp_msmt = 2e-10 / measurements[:,5]**2
+
+        # detection with occlusion
+        detect_prob = tm.detect(samples)
+        sample_miss_pure = 1 - detect_prob
+        if self.occlusion == 'None':
+            pass
+        elif self.occlusion == 'MWO':
+            measurements_occluding = tm.prepMeasurements4Occlusion(measurements)
+            measurement_existences = np.ones((measurements.shape[0],))
+            sample_miss_pure += detect_prob *\
+                        tm.occlude(samples, measurements_occluding, measurement_existences)
+        elif self.occlusion == 'OWO':
+            object_means = objectMeans(samples, existences, ids,
+                                       np.empty((nobjects, samples.shape[1])))
+            object_exist = objectSum(existences, ids, np.empty(nobjects))
+            include_occluding = object_exist > .1
+            object_means[include_occluding] /= object_exist[include_occluding,None]
+            occluding_objects = tm.prepObjects4Occlusion(object_means[include_occluding])
+            occluding_exist = object_exist[include_occluding]
+            detect_prob *= 1 - tm.occludeOWO2(samples, ids, np.where(include_occluding)[0],
+                                           occluding_objects, occluding_exist)
+            sample_miss_pure[:] = 1 - detect_prob
+
+        # parallel likelihood determination
+        sample_miss = existences * sample_miss_pure
+        prep = tm.prepLikelihood(samples)
+        sample_msmt = tm.likelihoods(samples, prep,
+                                     tm.preprocessMeasurements(measurements),
+                                     existences * detect_prob,
+                                     np.empty((nsamples, n_measurements)))
+
+        # reduce to object likelihoods
+        object_msmt = objectSum(sample_msmt, ids,
+                                np.empty((nobjects, n_measurements)))
+        object_exist = objectSum(existences, ids, np.empty(nobjects))
+        object_miss = 1 - object_exist + objectSum(sample_miss, ids,
+                                                   np.empty(nobjects))
+        sprouts = np.any(ids,axis=1)==False # poisson generated terms
+        miss_msmt = fp_msmt + np.sum(sample_msmt[sprouts],axis=0)
+
+        # data association, from reference [15]
+        jam_object_msmt, jam_object_miss, jam_miss_msmt, _, iterations =\
+                    association.DA_JAM(object_msmt, object_miss, miss_msmt,
+                                       gate=self.jam_gate)
+        self.jam_iterations = iterations
+
+        # expand to sample assignment probabilities
+        match_object_msmt = jam_object_msmt.copy()
+        match_object_msmt[object_msmt > 1e-30] /= object_msmt[object_msmt > 1e-30]
+        match_object_miss = jam_object_miss.copy()
+        match_object_miss[object_miss > 1e-30] /= object_miss[object_miss > 1e-30]
+        match_miss_msmt = jam_miss_msmt.copy()
+        match_miss_msmt[miss_msmt > 1e-30] /= miss_msmt[miss_msmt > 1e-30]
+        match_sample_msmt = np.concatenate((sample_miss[:,None],
+                                            sample_msmt), axis=1)
+        objectScale(ids, match_object_miss, match_object_msmt, match_sample_msmt)
+        match_sample_msmt[sprouts,1:n_measurements+1] *= match_miss_msmt
+
+        # find the top entries in match_sample_msmt
+        percentile = 100.*n_measurements/(n_measurements + 1)
+        min_value = np.percentile(match_sample_msmt, percentile, interpolation='lower')
+        included_match_mtx = match_sample_msmt > min_value
+        remaining_samples = nsamples - np.sum(included_match_mtx)
+        identicals_samp, identicals_msmt = np.where(match_sample_msmt == min_value)
+        included_match_mtx[identicals_samp[:remaining_samples],
+                           identicals_msmt[:remaining_samples]] = True
+        match_idxs = np.cumsum(np.sum(included_match_mtx, axis=0))
+        match_sample_msmt *= included_match_mtx
+        # find id spaces for potential new objects
+        # and handle unique labelling
+        object_matches = objectSum(np.sum(match_sample_msmt, axis=1), ids,
+                                   np.empty(nobjects))
+        objects_ordered = np.argsort(object_matches)
+        object_cum = np.cumsum(object_matches[objects_ordered])
+        object_cum = np.append([0], object_cum[:n_measurements])
+        new_msmt_matches = np.sum(match_sample_msmt[sprouts, 1:], axis=0)
+        new_msmts_ordered = np.argsort(new_msmt_matches)
+        new_msmt_cum = np.cumsum(new_msmt_matches[new_msmts_ordered])
+        new_msmt_cum = np.append([0], new_msmt_cum)[::-1]
+        n_new_ids = np.argmin(object_cum + new_msmt_cum)
+        replaced_ids = objects_ordered[:n_new_ids]
+        replacing_ids = {msmt_idx:-1 for msmt_idx in range(n_measurements)}
+        for new_id_num in range(n_new_ids):
+            replacing_ids[new_msmts_ordered[-new_id_num-1]] = replaced_ids[new_id_num]
+        ids[:,replaced_ids] = False
+        unique_ids[replaced_ids] = range(n_new_ids)
+        unique_ids[replaced_ids] += self.unique_id_count
+        self.unique_id_count += n_new_ids
+
+        # update
+        include_nomatch = included_match_mtx[:,0]
+        tm.updateOnMiss(samples[include_nomatch], sample_miss_pure[include_nomatch],
+                        measurements, out = new_samples[:match_idxs[0]])
+        new_exist[:match_idxs[0]] = match_sample_msmt[include_nomatch,0]
+        new_ids[:match_idxs[0]] = ids[include_nomatch]
+        prep = tm.prepUpdate(samples)
+        for msmt_idx, measurement in enumerate(measurements):
+            # created this measurement
+            include_match = included_match_mtx[:,msmt_idx+1]
+            match_1 = match_idxs[msmt_idx]
+            match_2 = match_idxs[msmt_idx+1]
+            tm.update(samples[include_match], prep[include_match], measurement,
+                      out = new_samples[match_1:match_2])
+            new_exist[match_1:match_2] = match_sample_msmt[include_match,msmt_idx+1]
+            new_ids_msmt = ids[include_match]
+            if replacing_ids[msmt_idx] >= 0:
+                new_ids_msmt[sprouts[include_match], replacing_ids[msmt_idx]] = True
+            new_ids[match_1:match_2] = new_ids_msmt
+
+        ## rearrange new and old structures
+        self.samples, self.new_samples = new_samples, samples
+        self.existences, self.new_exist = new_exist, existences
+        self.ids, self.new_ids = new_ids, ids
+        samples, existences, ids = new_samples, new_exist, new_ids
+
+        ## prune via KDTree
+        # very similar particles are 'merged' by combining their existences
+        # one tree for all objects, each object is shifted along an extra
+        # dimension by more than the search distance so pairs stay within objects
+        prunable = np.where(existences > 1e-3/nsamples)[0]
+        prune_rows, prune_objs = np.nonzero(ids[prunable])
+        prunable = prunable[prune_rows]
+        if prunable.shape[0] > 1:
+            kdmeans = np.empty((prunable.shape[0], 7))
+            kdmeans[:,:6] = samples[prunable][:,[0,2,9,11,1,10]]
+            kdmeans[:,4:6] *= tm.fps / tm.skip
+            kdmeans[:,6] = prune_objs * prune_object_spacing
+            pairs = cKDTree(kdmeans).query_pairs(1., eps=1., output_type='ndarray')
+            mergePairs(existences, prunable, pairs)
+
+        ## get estimates
+        object_means = objectMeans(samples, existences, ids,
+                                   np.empty((nobjects, samples.shape[1])))
+        object_exist = objectSum(existences, ids, np.empty(nobjects))
+        assert np.all(object_exist <= 1)
+        object_means[object_exist > 1e-10] /=\
+                                object_exist[object_exist > 1e-10,None]
+        reports = np.append(unique_ids[:,None], tm.output(object_means), axis=1)
+        return reports, object_exist
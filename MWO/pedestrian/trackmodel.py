@@ -8,41 +8,21 @@ samples = mean x, mean x', mean w, var x, var x', var w, cov x/x', cov x/w, cov
 horizontal and vertical features are independent
 """
 import numpy as np
+import numba as nb
 
-data_folder = 'train/MOT17-04-FRCNN/'
 fps=30
 skip=2
 
 sample_nft = 20
 
-# reload data to get params
-# this is really lazy, but I don't want to put the whole code into a class
-# or something
-data = np.loadtxt(data_folder + 'det.txt', delimiter=',')
-minx = np.min(data[:,1])
-maxx = np.max(data[:,1]+data[:,3])
-miny = np.min(data[:,2])
-maxy = np.max(data[:,2]+data[:,4])
-avgwidth = np.mean(data[:,3]) / 2.
-avgheight = np.mean(data[:,4]) / 2.
-stdwidth = np.std(data[:,3]) / 2.
-stdheight = np.std(data[:,4]) / 2.
-imshape_corr = np.corrcoef(data[:,3], data[:,4])[0][1]
-stdmotion = avgheight/fps*skip # assume person moves 1-person-per-second
-avg_num_msmts = float(data.shape[0]) / (data[-1,0] - data[0,0] + 1)
-del data # to save memory
+# parameters that depend on the dataset (image bounds, box sizes, number of
+# detections) are set by configure(), with statistics from datasetStats
+# so importing doesn't read any files, but configure must be called first
 
 
 ## initialization
 initial_detectability = .9
 initial_occludability = .9
-initial_sample = np.array([(maxx+minx)/2., 0, avgwidth,
-                           (maxx-minx)**2, stdmotion**2*4, stdwidth**2*16, 0, 0, 0,
-                           (maxy+miny)/2., 0, avgheight,
-                           (maxy-miny)**2, stdmotion**2*4, stdheight**2*16, 0, 0, 0,
-                           initial_detectability, initial_occludability])
-# only a fraction of this probability is actually in image zone...
-initial_cardinality = avg_num_msmts / .16
 
 
 ## prediction
@@ -50,7 +30,6 @@ detectability_stationary = .9# .93#
 detectability_half_second_ratio = .99
 occludability_stationary = .8# .00001#
 occludability_half_second_ratio = .8# 1.#
-process_noise = np.array([stdmotion/2, stdmotion/4, stdmotion/3])**2
 
 # markov transition probabilities for each step
 detectable_maintain = 1 - (1 - detectability_stationary) * (1 - 
@@ -100,32 +79,63 @@ secret_entry_card = 1. / fps * skip
 entry_detectability = .9
 entry_occludability = .5
 
-entry_sample_top = [(maxx+minx)/2., 0, avgwidth-stdwidth,
-                    (maxx-minx)**2, stdmotion**2*4, stdwidth**2, 0, 0, 0,
-                    miny, stdmotion/2, avgheight,
-                    stdmotion**2, stdmotion**2, stdheight**2, 0, 0, 0,
-                    entry_detectability, entry_occludability]
-entry_sample_bottom = [(maxx+minx)/2., 0, avgwidth+stdwidth,
-                       (maxx-minx)**2, stdmotion**2*4, stdwidth**2, 0, 0, 0,
-                       maxy, -stdmotion/2, avgheight,
-                       stdmotion**2, stdmotion**2, stdheight**2, 0, 0, 0,
-                       entry_detectability, entry_occludability]
-entry_sample_left = [minx, stdmotion/2, avgwidth,
-                     stdmotion**2, stdmotion**2, stdwidth**2, 0, 0, 0,
-                     (maxy+miny)/2., 0, avgheight,
-                     (maxy-miny)**2, stdmotion**2*4, stdheight**2, 0, 0, 0,
-                     entry_detectability, entry_occludability]
-entry_sample_right = [maxx, -stdmotion/2, avgwidth,
-                      stdmotion**2, stdmotion**2, stdwidth**2, 0, 0, 0,
-                      (maxy+miny)/2., 0, avgheight,
-                      (maxy-miny)**2, stdmotion**2*4, stdheight**2, 0, 0, 0,
-                      entry_detectability, entry_occludability]
-entry_samples = np.array([entry_sample_top, entry_sample_bottom, entry_sample_left,
-                          entry_sample_right, initial_sample])
 side_entry_cardinality = entry_cardinality / fps * skip / 4 / .36
 entry_cardinality = [side_entry_cardinality] * 4 + [secret_entry_card]
 
 
+## dataset-dependent parameters
+def configure(stats):
+    """ sets the parameters that depend on the dataset
+        stats = dict from datasetStats.load or datasetStats.estimate """
+    global minx, maxx, miny, maxy, avgwidth, avgheight, stdwidth, stdheight
+    global imshape_corr, stdmotion, avg_num_msmts, initial_sample
+    global initial_cardinality, process_noise, entry_samples
+    minx = stats['minx']
+    maxx = stats['maxx']
+    miny = stats['miny']
+    maxy = stats['maxy']
+    avgwidth = stats['avgwidth']
+    avgheight = stats['avgheight']
+    stdwidth = stats['stdwidth']
+    stdheight = stats['stdheight']
+    imshape_corr = stats['imshape_corr']
+    avg_num_msmts = stats['avg_num_msmts']
+    stdmotion = avgheight/fps*skip # assume person moves 1-person-per-second
+    
+    initial_sample = np.array([(maxx+minx)/2., 0, avgwidth,
+                               (maxx-minx)**2, stdmotion**2*4, stdwidth**2*16, 0, 0, 0,
+                               (maxy+miny)/2., 0, avgheight,
+                               (maxy-miny)**2, stdmotion**2*4, stdheight**2*16, 0, 0, 0,
+                               initial_detectability, initial_occludability])
+    # only a fraction of this probability is actually in image zone...
+    initial_cardinality = avg_num_msmts / .16
+    
+    process_noise = np.array([stdmotion/2, stdmotion/4, stdmotion/3])**2
+    
+    entry_sample_top = [(maxx+minx)/2., 0, avgwidth-stdwidth,
+                        (maxx-minx)**2, stdmotion**2*4, stdwidth**2, 0, 0, 0,
+                        miny, stdmotion/2, avgheight,
+                        stdmotion**2, stdmotion**2, stdheight**2, 0, 0, 0,
+                        entry_detectability, entry_occludability]
+    entry_sample_bottom = [(maxx+minx)/2., 0, avgwidth+stdwidth,
+                           (maxx-minx)**2, stdmotion**2*4, stdwidth**2, 0, 0, 0,
+                           maxy, -stdmotion/2, avgheight,
+                           stdmotion**2, stdmotion**2, stdheight**2, 0, 0, 0,
+                           entry_detectability, entry_occludability]
+    entry_sample_left = [minx, stdmotion/2, avgwidth,
+                         stdmotion**2, stdmotion**2, stdwidth**2, 0, 0, 0,
+                         (maxy+miny)/2., 0, avgheight,
+                         (maxy-miny)**2, stdmotion**2*4, stdheight**2, 0, 0, 0,
+                         entry_detectability, entry_occludability]
+    entry_sample_right = [maxx, -stdmotion/2, avgwidth,
+                          stdmotion**2, stdmotion**2, stdwidth**2, 0, 0, 0,
+                          (maxy+miny)/2., 0, avgheight,
+                          (maxy-miny)**2, stdmotion**2*4, stdheight**2, 0, 0, 0,
+                          entry_detectability, entry_occludability]
+    entry_samples = np.array([entry_sample_top, entry_sample_bottom, entry_sample_left,
+                              entry_sample_right, initial_sample])
+
+
 ## detection and occlusion
 def detect(samples): return samples[:,18]
 
@@ -143,32 +153,50 @@ def prepObjects4Occlusion(samples):
 
 bottom_gap_zero = -.1
 bottom_gap_one = .25
+# each obstacle blocks a sample by its overlap and by how far below the
+# sample's bottom it reaches, the sample is visible if no obstacle blocks it
+# obstacle_ids = object of each obstacle, whose samples it doesn't block, or -1
+# all samples and obstacles in one compiled pass
+@nb.jit(nopython=True, error_model='numpy')
+def _occlusion(samples, obstacles, existences, obstacle_ids, ids, out):
+    for i in range(samples.shape[0]):
+        x = samples[i,0]
+        width = samples[i,2]
+        y = samples[i,9]
+        height = samples[i,11]
+        total_visible = 1.
+        for k in range(obstacles.shape[0]):
+            if obstacle_ids[k] >= 0 and ids[i,obstacle_ids[k]]:
+                continue
+            bleft = obstacles[k,0]
+            bright = obstacles[k,1]
+            bup = obstacles[k,2]
+            bdown = obstacles[k,3]
+            itx_width = np.maximum(0., np.minimum(x + width, bright) -
+                                       np.maximum(x - width, bleft))
+            itx_height = np.maximum(0., np.minimum(y + height, bdown) -
+                                        np.maximum(y - height, bup))
+            itx_area = itx_width * itx_height / width / height / 4
+            bottom_diff = (bdown - y - height)/(bdown - bup)
+            block = np.minimum(1., np.maximum(0., itx_area*2))
+            block *= np.minimum(1., np.maximum(0., (bottom_diff-bottom_gap_zero)/
+                                           (bottom_gap_one-bottom_gap_zero)))
+            total_visible *= 1 - block * existences[k]
+        out[i] = samples[i,19] * (1 - total_visible)
+    return out
+
 def occlude(samples, obstacles, existences):
-    total_visible = np.ones((samples.shape[0],))
-    for k, obst in enumerate(obstacles):
-        itx_area = intersectArea(samples[:,0], samples[:,2], samples[:,9], samples[:,11],
-                                 obst[0], obst[1], obst[2], obst[3])
-        bottom_diff = (obst[3] - samples[:,9] - samples[:,11])/(obst[3]-obst[2])
-        block = np.minimum(1, np.maximum(0, itx_area*2))
-        block *= np.minimum(1, np.maximum(0,
-                 (bottom_diff-bottom_gap_zero)/(bottom_gap_one-bottom_gap_zero)))
-        total_visible *= 1 - block * existences[k]
-    return samples[:,19] * (1 - total_visible)
+    obstacle_ids = np.zeros((len(obstacles),), dtype=np.int64) - 1
+    return _occlusion(samples, np.asarray(obstacles, dtype=float).reshape((-1,4)),
+                      np.asarray(existences, dtype=float), obstacle_ids,
+                      np.zeros((samples.shape[0], 1), dtype=bool),
+                      np.empty((samples.shape[0],)))
 
 # make sure you don't let an object occlude itself
 def occludeOWO2(samples, ids, included_ids, objects, object_exists):
-    total_visible = np.ones((samples.shape[0],))
-    for k in range(object_exists.shape[0]):
-        included_samples = ids[:,included_ids[k]]==False
-        obst = objects[k]
-        itx_area = intersectArea(samples[:,0], samples[:,2], samples[:,9], samples[:,11],
-                                 obst[0], obst[1], obst[2], obst[3])
-        bottom_diff = (obst[3] - samples[:,9] - samples[:,11])/(obst[3]-obst[2])
-        block = np.minimum(1, np.maximum(0, itx_area*2))
-        block *= np.minimum(1, np.maximum(0,
-                 (bottom_diff-bottom_gap_zero)/(bottom_gap_one-bottom_gap_zero)))
-        total_visible[included_samples] *= 1 - block[included_samples] * object_exists[k]
-    return samples[:,19] * (1 - total_visible)
+    return _occlusion(samples, np.asarray(objects, dtype=float).reshape((-1,4)),
+                      np.asarray(object_exists, dtype=float),
+                      np.asarray(included_ids, dtype=np.int64), ids, np.empty((samples.shape[0],)))
 
 # ( p(x) - p(x)P_D(x) ) / ( 1 - P_D )
 # ( p(x) - p(x)P_D(x) + p(x)P_D(x)P_O(x) ) / ( 1 - P_D + P_OD )
@@ -283,105 +311,128 @@ def likelihood(samples, prep, measurement):
     return np.exp(-.5 * expterm)
 
 
+# likelihood() for every sample and measurement at once, times scale
+# msmts = preprocessMeasurements(measurements)
+@nb.jit(nopython=True)
+def likelihoods(samples, prep, msmts, scale, out):
+    for j in range(msmts.shape[0]):
+        msmt = msmts[j]
+        for i in range(samples.shape[0]):
+            if msmt[4] and msmt[5]: # both sides present
+                devl = msmt[0] - samples[i,0] + samples[i,2]
+                devr = msmt[1] - samples[i,0] - samples[i,2]
+                expterm = prep[i,7] + prep[i,2] * devl * devl +\
+                          prep[i,3] * devr * devr + prep[i,4] * devl * devr * 2
+            elif msmt[4]: # only left side present
+                devl = msmt[0] - samples[i,0] + samples[i,2]
+                expterm = prep[i,5] + prep[i,0] * devl * devl
+            elif msmt[5]:
+                devr = msmt[1] - samples[i,0] - samples[i,2]
+                expterm = prep[i,6] + prep[i,1] * devr * devr
+            else:
+                raise Exception
+            if msmt[6] and msmt[7]:
+                devl = msmt[2] - samples[i,9] + samples[i,11]
+                devr = msmt[3] - samples[i,9] - samples[i,11]
+                expterm += prep[i,15] + prep[i,10] * devl * devl +\
+                           prep[i,11] * devr * devr + prep[i,12] * devl * devr * 2
+            elif msmt[6]: # only top side present
+                devl = msmt[2] - samples[i,9] + samples[i,11]
+                expterm += prep[i,13] + prep[i,8] * devl * devl
+            elif msmt[5]: # same condition as likelihood()
+                devr = msmt[3] - samples[i,9] - samples[i,11]
+                expterm += prep[i,14] + prep[i,9] * devr * devr
+            else:
+                raise Exception
+            out[i,j] = scale[i] * np.exp(-.5 * expterm)
+    return out
+
 def prepUpdate(samples):
     return prepLikelihood(samples)
     
+@nb.jit(nopython=True)
+def _updateSide(s, p, o, low, high, has_low, has_high, f, q):
+    """ kalman update of one sample on one axis, features f to f+9 of the
+        sample s into o, prep terms q to q+8
+        returns the determinant of the covariance change """
+    devl = low - s[f] + s[f+2]
+    devr = high - s[f] - s[f+2]
+    sxl = s[f+3] - s[f+7]
+    svl = s[f+6] - s[f+8]
+    swl = s[f+7] - s[f+5]
+    sxr = s[f+3] + s[f+7]
+    svr = s[f+6] + s[f+8]
+    swr = s[f+7] + s[f+5]
+    if not has_high: # just left/top
+        o[f] += sxl * p[q] * devl
+        o[f+1] += svl * p[q] * devl
+        o[f+2] += swl * p[q] * devl
+        o[f+3] -= sxl * sxl * p[q]
+        o[f+4] -= svl * svl * p[q]
+        o[f+5] -= swl * swl * p[q]
+        o[f+6] -= sxl * svl * p[q]
+        o[f+7] -= sxl * swl * p[q]
+        o[f+8] -= svl * swl * p[q]
+    elif not has_low: # just right/bottom
+        o[f] += sxr * p[q+1] * devr
+        o[f+1] += svr * p[q+1] * devr
+        o[f+2] += swr * p[q+1] * devr
+        o[f+3] -= sxr * sxr * p[q+1]
+        o[f+4] -= svr * svr * p[q+1]
+        o[f+5] -= swr * swr * p[q+1]
+        o[f+6] -= sxr * svr * p[q+1]
+        o[f+7] -= sxr * swr * p[q+1]
+        o[f+8] -= svr * swr * p[q+1]
+    else:
+        kl0 = p[q+2] * sxl + p[q+4] * sxr
+        kl1 = p[q+2] * svl + p[q+4] * svr
+        kl2 = p[q+2] * swl + p[q+4] * swr
+        kr0 = p[q+3] * sxr + p[q+4] * sxl
+        kr1 = p[q+3] * svr + p[q+4] * svl
+        kr2 = p[q+3] * swr + p[q+4] * swl
+        o[f] += kl0 * devl + kr0 * devr
+        o[f+1] += kl1 * devl + kr1 * devr
+        o[f+2] += kl2 * devl + kr2 * devr
+        o[f+3] -= kl0 * sxl + kr0 * sxr
+        o[f+4] -= kl1 * svl + kr1 * svr
+        o[f+5] -= kl2 * swl + kr2 * swr
+        o[f+6] -= kl0 * svl + kr0 * svr
+        o[f+7] -= kl0 * swl + kr0 * swr
+        o[f+8] -= kl1 * swl + kr1 * swr
+    c0 = s[f+3] - o[f+3]
+    c1 = s[f+4] - o[f+4]
+    c2 = s[f+5] - o[f+5]
+    c3 = s[f+6] - o[f+6]
+    c4 = s[f+7] - o[f+7]
+    c5 = s[f+8] - o[f+8]
+    return c0*c1*c2 - c0*c5*c5 - c1*c4*c4 - c2*c3*c3 + 2*c3*c4*c5
+
+@nb.jit(nopython=True)
+def _update(samples, prep, msmt, out):
+    """ update() for each sample, returns the lowest determinant of the
+        covariance changes """
+    min_det = np.inf
+    for i in range(samples.shape[0]):
+        s = samples[i]
+        o = out[i]
+        o[:] = s
+        det = _updateSide(s, prep[i], o, msmt[0], msmt[1], msmt[4], msmt[5],
+                          0, 0)
+        min_det = min(min_det, det)
+        det = _updateSide(s, prep[i], o, msmt[2], msmt[3], msmt[6], msmt[7],
+                          9, 8)
+        min_det = min(min_det, det)
+        o[18] = 1.
+    return min_det
+
 # samples = old samples
 # out = new samples
 def update(samples, prep, measurement, out=None):
     msmt = preprocessMeasurement(measurement)
     if out is None:
-        out = samples.copy()
-    else:
-        out[:] = samples
-        
-    devl = msmt[0] - samples[:,0] + samples[:,2]
-    devr = msmt[1] - samples[:,0] - samples[:,2]
-    sxl = samples[:,3] - samples[:,7]
-    svl = samples[:,6] - samples[:,8]
-    swl = samples[:,7] - samples[:,5]
-    sxr = samples[:,3] + samples[:,7]
-    svr = samples[:,6] + samples[:,8]
-    swr = samples[:,7] + samples[:,5]
-    
-    if not msmt[5]: # just left
-        out[:,0] += sxl * prep[:,0] * devl
-        out[:,1] += svl * prep[:,0] * devl
-        out[:,2] += swl * prep[:,0] * devl
-        out[:,3] -= sxl * sxl * prep[:,0]
-        out[:,4] -= svl * svl * prep[:,0]
-        out[:,5] -= swl * swl * prep[:,0]
-        out[:,6] -= sxl * svl * prep[:,0]
-        out[:,7] -= sxl * swl * prep[:,0]
-        out[:,8] -= svl * swl * prep[:,0]
-    elif not msmt[4]: # just right
-        out[:,0] += sxr * prep[:,1] * devr
-        out[:,1] += svr * prep[:,1] * devr
-        out[:,2] += swr * prep[:,1] * devr
-        out[:,3] -= sxr * sxr * prep[:,1]
-        out[:,4] -= svr * svr * prep[:,1]
-        out[:,5] -= swr * swr * prep[:,1]
-        out[:,6] -= sxr * svr * prep[:,1]
-        out[:,7] -= sxr * swr * prep[:,1]
-        out[:,8] -= svr * swr * prep[:,1]
-    else:
-        PH = np.array(((sxl,svl,swl),(sxr,svr,swr))).T
-        Kl = prep[:,None,2] * PH[:,:,0] + prep[:,None,4] * PH[:,:,1]
-        Kr = prep[:,None,3] * PH[:,:,1] + prep[:,None,4] * PH[:,:,0]
-        out[:,:3] += Kl * devl[:,None] + Kr * devr[:,None]
-        out[:,3] -= Kl[:,0] * PH[:,0,0] + Kr[:,0] * PH[:,0,1]
-        out[:,4] -= Kl[:,1] * PH[:,1,0] + Kr[:,1] * PH[:,1,1]
-        out[:,5] -= Kl[:,2] * PH[:,2,0] + Kr[:,2] * PH[:,2,1]
-        out[:,6] -= Kl[:,0] * PH[:,1,0] + Kr[:,0] * PH[:,1,1]
-        out[:,7] -= Kl[:,0] * PH[:,2,0] + Kr[:,0] * PH[:,2,1]
-        out[:,8] -= Kl[:,1] * PH[:,2,0] + Kr[:,1] * PH[:,2,1]
-        
-    assert np.all(determinant3(samples[:,3:9] - out[:,3:9]) >= -1e-1)
-        
-    devl = msmt[2] - samples[:,9] + samples[:,11]
-    devr = msmt[3] - samples[:,9] - samples[:,11]
-    sxl = samples[:,12] - samples[:,16]
-    svl = samples[:,15] - samples[:,17]
-    swl = samples[:,16] - samples[:,14]
-    sxr = samples[:,12] + samples[:,16]
-    svr = samples[:,15] + samples[:,17]
-    swr = samples[:,16] + samples[:,14]
-    
-    if not msmt[7]: # just top
-        out[:,9] += sxl * prep[:,8] * devl
-        out[:,10] += svl * prep[:,8] * devl
-        out[:,11] += swl * prep[:,8] * devl
-        out[:,12] -= sxl * sxl * prep[:,8]
-        out[:,13] -= svl * svl * prep[:,8]
-        out[:,14] -= swl * swl * prep[:,8]
-        out[:,15] -= sxl * svl * prep[:,8]
-        out[:,16] -= sxl * swl * prep[:,8]
-        out[:,17] -= svl * swl * prep[:,8]
-    elif not msmt[6]: # just bottom
-        out[:,9] += sxr * prep[:,9] * devr
-        out[:,10] += svr * prep[:,9] * devr
-        out[:,11] += swr * prep[:,9] * devr
-        out[:,12] -= sxr * sxr * prep[:,9]
-        out[:,13] -= svr * svr * prep[:,9]
-        out[:,14] -= swr * swr * prep[:,9]
-        out[:,15] -= sxr * svr * prep[:,9]
-        out[:,16] -= sxr * swr * prep[:,9]
-        out[:,17] -= svr * swr * prep[:,9]
-    else:
-        PH = np.array(((sxl,svl,swl),(sxr,svr,swr))).T
-        Kl = prep[:,None,10] * PH[:,:,0] + prep[:,None,12] * PH[:,:,1]
-        Kr = prep[:,None,11] * PH[:,:,1] + prep[:,None,12] * PH[:,:,0]
-        out[:,9:12] += Kl * devl[:,None] + Kr * devr[:,None]
-        out[:,12] -= Kl[:,0] * PH[:,0,0] + Kr[:,0] * PH[:,0,1]
-        out[:,13] -= Kl[:,1] * PH[:,1,0] + Kr[:,1] * PH[:,1,1]
-        out[:,14] -= Kl[:,2] * PH[:,2,0] + Kr[:,2] * PH[:,2,1]
-        out[:,15] -= Kl[:,0] * PH[:,1,0] + Kr[:,0] * PH[:,1,1]
-        out[:,16] -= Kl[:,0] * PH[:,2,0] + Kr[:,0] * PH[:,2,1]
-        out[:,17] -= Kl[:,1] * PH[:,2,0] + Kr[:,1] * PH[:,2,1]
-                     
-    assert np.all(determinant3(samples[:,12:18] - out[:,12:18]) >= -1e-1)
-        
-    out[:,18] = 1.
+        out = np.empty(samples.shape)
+    min_det = _update(samples, prep, msmt, out)
+    assert min_det >= -1e-1
     return out
       
 # slower but definitely correct
@@ -498,11 +549,17 @@ def preprocessMeasurement(msmt):
         msmt2[3] = msmt[1]+msmt[3]
     return msmt2
 
-def intersectArea(x, width, y, height, bleft, bright, bup, bdown):
-    itx_width = np.maximum(0, 
-                    np.minimum(x + width, bright) -
-                    np.maximum(x - width, bleft))
-    itx_height = np.maximum(0, 
-                    np.minimum(y + height, bdown) -
-                    np.maximum(y - height, bup))
-    return itx_width * itx_height / width / height / 4
\ No newline at end of file
+def preprocessMeasurements(measurements):
+    """ preprocessMeasurement for each row """
+    msmts = np.zeros((measurements.shape[0], 8))
+    left = measurements[:,1]
+    right = measurements[:,1] + measurements[:,3]
+    top = measurements[:,2]
+    bottom = measurements[:,2] + measurements[:,4]
+    for k, (value, valid) in enumerate(((left, left > minx),
+                                        (right, right < maxx),
+                                        (top, top > miny),
+                                        (bottom, bottom < maxy))):
+        msmts[:,k+4] = valid
+        msmts[valid,k] = value[valid]
+    return msmts
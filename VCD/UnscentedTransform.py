@@ -12,11 +12,24 @@ Cartesian Coordinate Systems", Julier & Uhlmann '97.
 """
 import numpy as np
 
+## points and weights already generated, by (n, s1)
+_cache = {}
+
 def getUTpoints(n, s1 = 1.):
-    """ Generates points and weights
+    """ Generates points and weights, or returns the ones generated by an
+        earlier call. The returned arrays are shared and read-only.
         
         n = number of dimensions
         s1 = distance of the points along each axis """
+    key = (n, float(s1))
+    if key not in _cache:
+        points, weights = _makeUTpoints(n, s1)
+        points.flags.writeable = False
+        weights.flags.writeable = False
+        _cache[key] = (points, weights)
+    return _cache[key]
+
+def _makeUTpoints(n, s1):
     s2, w0, w1, w2 = getUTparams(n, s1)
     points = np.zeros((2*n*(n-1)+2*n+1, n))
     for i in range(n):
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the alarms on a frozen set of scenarios, separately from the
+simulate_X experiments.
+
+Each scenario's vehicles are drawn by the same function as in its simulate_X
+file (see initialStates), but from a fixed seed, and every alarm is given the
+same random state for each vehicle pair. So two runs differ only by the alarms'
+code and the machine's speed.
+For each alarm, the table has:
+    latency percentiles (ms), using the runtime each alarm returns
+    mean and max absolute error against alarm_truth_batch
+    AUC, from scoring.AUC
+    pareto - True if no other alarm is both faster (median latency) and more
+             accurate (mean error)
+The true probabilities are saved with the baseline, as they take the longest
+to compute and should not change between runs.
+
+A run can be saved as the baseline, and later runs are compared to it:
+alarms that are slower, less accurate, or have lower AUC by more than the
+tolerances are flagged in the regression column.
+
+python benchmark.py line --nsims 200 --save  # store a baseline
+python benchmark.py line --nsims 200         # compare to it
+"""
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import alarms, motionModels, scoring, initialStates
+
+## percentiles of latency to report
+percentiles = (50, 90, 99)
+
+
+def lineScenario(nsims, rng, timelen=1., timeback=.5):
+    """ The left turn scenario of simulate_1 (or simulate_2 with timelen=2.5,
+        timeback=2) """
+    timeres = .1
+    initialcovariance = np.diag([2., .5]) * .1
+    times = np.array([timeres] * int(timelen/timeres))
+    MM1 = motionModels.MM_LineCV('left-right', np.diag([2., .5]))
+    MM2 = motionModels.MM_LineCV('right-down', np.diag([2., .5]))
+    vehicles1, vehicles2 = initialStates.lineVehicles(nsims, timeback,
+                                                      initialcovariance, rng)
+    return vehicles1, vehicles2, MM1, MM2, times
+
+def bicycleScenario(nsims, rng, timelen=1., timeback=.5):
+    """ The random bicycle model scenario of simulate_3 """
+    timeres = .1
+    initialnoise = np.diag([1., 1., .5, .1, 0.05, 0.01]) * .1
+    times = np.zeros((int(timelen/timeres),)) + timeres
+    noise = np.diag([1., 1., .5, .1, 0.05, 0.01])
+    MM1 = motionModels.MM_Bicycle(noise)
+    MM2 = motionModels.MM_Bicycle(noise)
+    vehicles1, vehicles2 = initialStates.bicycleVehicles(nsims, timeback,
+                                                         initialnoise, rng)
+    return vehicles1, vehicles2, MM1, MM2, times
+
+## name -> (scenario function, keyword arguments, regressor module)
+scenarios = {'line' : (lineScenario, {}, 'regressor_1'),
+             'line_2.5s' : (lineScenario, {'timelen':2.5, 'timeback':2.},
+                            'regressor_2'),
+             'bicycle' : (bicycleScenario, {}, 'regressor_3')}
+
+
+def _regressorAlarm(module):
+    """ The regressor's alarm, or None if its model can't be loaded """
+    try:
+        regressor = __import__(module)
+        model = regressor.Model('MLP')
+    except (ImportError, SyntaxError, IOError, OSError) as error:
+        print("skipping {:s}: {:s}".format(module, str(error)))
+        return None
+    if hasattr(model, 'alarm'):
+        return model.alarm
+    return model.alarm_model
+
+def alarmList(scenario, MM1, MM2, mc_samplecounts=(10, 100, 1000)):
+    """ (label, alarm) for each alarm that applies to the scenario, alarms take
+        (vehicle1, vehicle2, MM1, MM2, times) """
+    alarmlist = [('truth', alarms.alarm_truth)]
+    for nSamples in mc_samplecounts:
+        alarmlist += [(str(nSamples)+' MCS',
+                       lambda v1,v2,M1,M2,t,n=nSamples:
+                           alarms.alarm_MCS(v1,v2,M1,M2,t,n)),
+                      (str(nSamples)+' MCS 2',
+                       lambda v1,v2,M1,M2,t,n=nSamples:
+                           alarms.alarm_MCS_2(v1,v2,M1,M2,t,n))]
+        if hasattr(MM1, 'sampleTrajectory') and hasattr(MM2,
+                                                        'sampleTrajectory'):
+            alarmlist += [(str(nSamples)+' MCS 3',
+                           lambda v1,v2,M1,M2,t,n=nSamples:
+                               alarms.alarm_MCS_3(v1,v2,M1,M2,t,n))]
+    alarmlist += [('expected', alarms.alarm_expected),
+                  ('UT 1', alarms.alarm_UT_1),
+                  ('UT 2', alarms.alarm_UT_2),
+                  ('UT 3', alarms.alarm_UT_3)]
+    if isinstance(MM1, motionModels.MM_LineCV) and isinstance(
+                                            MM2, motionModels.MM_LineCV):
+        alarmlist += [('analytic', alarms.alarm_analytic)]
+    regressorAlarm = _regressorAlarm(scenarios[scenario][2])
+    if regressorAlarm is not None:
+        alarmlist += [('MLP', regressorAlarm)]
+    return alarmlist
+
+
+def getTruth(scenario, vehicles1, vehicles2, MM1, MM2, times, seed,
+             storedir=None):
+    """ alarm_truth_batch, loaded from or saved to storedir if given """
+    filename = None
+    if storedir is not None:
+        filename = os.path.join(storedir, 'truth_{:s}_{:d}_{:d}.npy'.format(
+                                        scenario, seed, len(vehicles1)))
+        if os.path.exists(filename):
+            return np.load(filename)
+    np.random.seed(seed)
+    truth = np.array([prob for prob, runtime in alarms.alarm_truth_batch(
+                                    vehicles1, vehicles2, MM1, MM2, times)])
+    if filename is not None:
+        if not os.path.isdir(storedir):
+            os.makedirs(storedir)
+        np.save(filename, truth)
+    return truth
+
+def run(scenario='line', nsims=200, seed=0, storedir=None, alarmlist=None):
+    """ Runs every alarm on the scenario's vehicle pairs.
+        Returns a table with one row per alarm, see summarize. """
+    function, kwargs = scenarios[scenario][:2]
+    rng = np.random.RandomState(seed)
+    vehicles1, vehicles2, MM1, MM2, times = function(nsims, rng, **kwargs)
+    simseeds = rng.randint(2**31 - 1, size=nsims)
+    truth = getTruth(scenario, vehicles1, vehicles2, MM1, MM2, times, seed,
+                     storedir)
+    if alarmlist is None:
+        alarmlist = alarmList(scenario, MM1, MM2)
+    results = {}
+    for label, alarm in alarmlist:
+        preds = np.empty((nsims,))
+        runtimes = np.empty((nsims,))
+        for sim in range(nsims):
+            np.random.seed(simseeds[sim])
+            result = alarm(vehicles1[sim], vehicles2[sim], MM1, MM2, times)
+            preds[sim], runtimes[sim] = result[:2]
+        results[label] = (preds, runtimes)
+    return summarize(truth, results, [label for label, alarm in alarmlist])
+
+def paretoFront(latency, error):
+    """ True for each point that isn't dominated, i.e. no other point is at
+        least as fast and as accurate, and better in one of the two """
+    latency = np.asarray(latency)
+    error = np.asarray(error)
+    better = ((latency[None,:] <= latency[:,None]) &
+              (error[None,:] <= error[:,None]) &
+              ((latency[None,:] < latency[:,None]) |
+               (error[None,:] < error[:,None])))
+    return ~np.any(better, axis=1)
+
+def summarize(truth, results, labels=None):
+    """ results = dict of label -> (predicted probabilities, runtimes in s)
+        returns a DataFrame with one row per alarm, in order of labels """
+    if labels is None:
+        labels = sorted(results)
+    table = pd.DataFrame(index=pd.Index(labels, name='alarm'))
+    for label in labels:
+        preds, runtimes = results[label]
+        for percentile in percentiles:
+            table.loc[label, 'p{:d} ms'.format(percentile)] = np.percentile(
+                                            runtimes, percentile) * 1000
+        error = np.abs(preds - truth)
+        table.loc[label, 'mean error'] = np.mean(error)
+        table.loc[label, 'max error'] = np.max(error)
+        table.loc[label, 'AUC'] = scoring.AUC(*scoring.ROC(truth, preds))
+    table['pareto'] = paretoFront(table['p50 ms'], table['mean error'])
+    return table
+
+def compare(table, baseline, latencyTolerance=.5, errorTolerance=.005,
+            aucTolerance=.01):
+    """ Adds a regression column listing what got worse since the baseline.
+        latencyTolerance = allowed relative increase in median latency
+        errorTolerance, aucTolerance = allowed absolute change
+        Alarms that aren't in the baseline are marked as new. """
+    flags = []
+    for label in table.index:
+        if label not in baseline.index:
+            flags += ['new']
+            continue
+        old = baseline.loc[label]
+        new = table.loc[label]
+        flag = []
+        if new['p50 ms'] > old['p50 ms'] * (1 + latencyTolerance):
+            flag += ['latency x{:.2f}'.format(new['p50 ms'] / old['p50 ms'])]
+        if new['mean error'] > old['mean error'] + errorTolerance:
+            flag += ['error +{:.4f}'.format(new['mean error'] -
+                                            old['mean error'])]
+        if new['AUC'] < old['AUC'] - aucTolerance:
+            flag += ['AUC -{:.4f}'.format(old['AUC'] - new['AUC'])]
+        flags += [', '.join(flag)]
+    table = table.copy()
+    table['regression'] = flags
+    return table
+
+def baselineFile(scenario, storedir):
+    return os.path.join(storedir, 'baseline_{:s}.csv'.format(scenario))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark the alarms')
+    parser.add_argument('scenario', nargs='?', default='line',
+                        choices=sorted(scenarios))
+    parser.add_argument('--nsims', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--storedir', default='benchmarks',
+                        help='where baselines and true probabilities are kept')
+    parser.add_argument('--save', action='store_true',
+                        help='store this run as the baseline')
+    args = parser.parse_args()
+
+    table = run(args.scenario, args.nsims, args.seed, args.storedir)
+    filename = baselineFile(args.scenario, args.storedir)
+    regressions = False
+    if args.save:
+        table.to_csv(filename)
+    elif os.path.exists(filename):
+        table = compare(table, pd.read_csv(filename, index_col=0))
+        regressions = np.any((table['regression'] != '') &
+                             (table['regression'] != 'new'))
+    pd.set_option('display.width', 200)
+    print(table.sort_values('p50 ms').to_string(float_format='{:.4f}'.format))
+    if regressions:
+        print("regressions since baseline")
+        sys.exit(1)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled versions of the bicycle motion model's sampling and unscented
+transform, for use in Monte Carlo alarms. MM_BicycleFast behaves like
+motionModels.MM_Bicycle, with two differences:
+    - motion noise is drawn from a seeded generator into a buffer that is kept
+      between calls, so results are repeatable and nothing is reallocated
+    - sampleTrajectory moves samples through every timestep in one call, and
+      returns their XY position at each timestep (see alarms.alarm_MCS_3)
+Angles are kept within +-pi, as in MM_Bicycle.UTstep.
+
+This module needs numba, motionModels does not.
+"""
+import numpy as np
+import numba as nb
+from motionModels import MM_Bicycle
+
+
+@nb.jit(nopython=True)
+def _rectify(theta):
+    if theta > np.pi:
+        return theta - 2*np.pi
+    if theta < -np.pi:
+        return theta + 2*np.pi
+    return theta
+
+@nb.jit(nopython=True)
+def _step(state, time, out):
+    """ MM_Bicycle.expected for one state """
+    out[0] = state[0] + np.cos(state[2])*state[3]*time
+    out[1] = state[1] + np.sin(state[2])*state[3]*time
+    out[2] = state[2] + state[5]*time
+    out[3] = state[3] + state[4]*time
+    out[4] = state[4]
+    out[5] = state[5]
+
+@nb.jit(nopython=True)
+def propagate(states, times, noise, chol, xy):
+    """ Moves each row of states through every timestep, in place.
+        noise = standard normal draws, shape (timesteps, samples, 6)
+        chol = lower cholesky factor of the noise covariance for one second
+        xy = output, XY position of each sample after each timestep,
+             shape (timesteps, samples, 3) """
+    nsamples = states.shape[0]
+    moved = np.empty(6)
+    for t in range(times.shape[0]):
+        scale = np.sqrt(times[t])
+        for n in range(nsamples):
+            _step(states[n], times[t], moved)
+            for i in range(6):
+                total = 0.
+                for j in range(i+1):
+                    total += chol[i,j] * noise[t,n,j]
+                states[n,i] = moved[i] + total * scale
+            states[n,2] = _rectify(states[n,2])
+            xy[t,n,0] = states[n,0]
+            xy[t,n,1] = states[n,1]
+            xy[t,n,2] = states[n,2]
+
+@nb.jit(nopython=True)
+def UTstep(inpoints, time, utpoints, weights, cov):
+    """ MM_Bicycle.UTstep """
+    npoints = inpoints.shape[0]
+    points = np.empty((npoints, 6))
+    for n in range(npoints):
+        _step(inpoints[n], time, points[n])
+    mean = np.zeros(6)
+    cosmean = 0.
+    sinmean = 0.
+    for n in range(npoints):
+        for i in range(6):
+            mean[i] += weights[n] * points[n,i]
+        cosmean += weights[n] * np.cos(points[n,2])
+        sinmean += weights[n] * np.sin(points[n,2])
+    mean[2] = np.arctan2(sinmean, cosmean)
+    newcov = cov * time
+    for n in range(npoints):
+        for i in range(6):
+            points[n,i] -= mean[i]
+        points[n,2] = _rectify(points[n,2])
+        for i in range(6):
+            for j in range(6):
+                newcov[i,j] += weights[n] * points[n,i] * points[n,j]
+    chol = np.linalg.cholesky(newcov)
+    outpoints = np.empty((utpoints.shape[0], 6))
+    for n in range(utpoints.shape[0]):
+        for i in range(6):
+            total = mean[i]
+            for j in range(i+1):
+                total += utpoints[n,j] * chol[i,j]
+            outpoints[n,i] = total
+        outpoints[n,2] = _rectify(outpoints[n,2])
+    return outpoints
+
+
+class MM_BicycleFast(MM_Bicycle):
+    """ MM_Bicycle with compiled sampling and unscented transform steps.
+        seed = seed of the generator used for motion noise """
+
+    def __init__(self, noiseMatrix, seed=0):
+        MM_Bicycle.__init__(self, noiseMatrix)
+        self.chol = np.linalg.cholesky(noiseMatrix)
+        self.rng = np.random.default_rng(seed)
+        self._noise = np.empty((0,))
+        self._points = np.ascontiguousarray(self.points)
+
+    def _standardNoise(self, ntimes, nsamples):
+        """ fills the noise buffer, enlarging it if needed """
+        size = ntimes * nsamples * 6
+        if self._noise.shape[0] < size:
+            self._noise = np.empty((size,))
+        noise = self._noise[:size]
+        self.rng.standard_normal(out=noise)
+        return noise.reshape((ntimes, nsamples, 6))
+
+    def sampleTrajectory(self, state, times):
+        """ Moves samples through each timestep, returns each one's XY
+            position after each timestep, shape (timesteps, samples, 3). """
+        states = np.array(state, dtype=float, ndmin=2)
+        times = np.asarray(times, dtype=float)
+        xy = np.empty((times.shape[0], states.shape[0], 3))
+        noise = self._standardNoise(times.shape[0], states.shape[0])
+        propagate(states, times, noise, self.chol, xy)
+        return xy
+
+    def sample(self, state, time, nsamples = 1):
+        if state.ndim == 1:
+            states = np.tile(state, (nsamples, 1))
+        else:
+            states = state.copy()
+        noise = self._standardNoise(1, states.shape[0])
+        xy = np.empty((1, states.shape[0], 3))
+        propagate(states, np.array((time,), dtype=float), noise, self.chol, xy)
+        if state.ndim == 1 and nsamples == 1:
+            return states[0]
+        return states
+
+    def UTstep(self, inpoints, time):
+        return UTstep(np.ascontiguousarray(inpoints, dtype=float), float(time),
+                      self._points, self.weights, self.cov)
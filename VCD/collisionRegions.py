@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputes where two vehicles on fixed routes collide, in terms of their
+displacements along those routes.
+
+For vehicles following roadLoc routes, as in motionModels.MM_LineCV, whether
+they collide depends only on the pair of displacements (d1, d2) and not on the
+time or velocities. The set of colliding (d1, d2) is found by checking the
+center of each cell of a grid, and stored as a union of disjoint rectangles,
+lo1 <= d1 < hi1 and lo2 <= d2 < hi2. The probability that normally distributed
+displacements collide is then a sum of products of normal CDFs, see
+alarms.alarm_analytic.
+
+Regions are saved to storedir the first time they are computed, and kept in
+memory once loaded. They are stored under the routes' names along with a hash
+of the routes' geometry, so a route that is changed but keeps its name gets a
+new region. Collisions outside of bounds are not included.
+"""
+import os
+import zlib
+import numpy as np
+from collisionCheck import check as collisionCheck, Vlen, Vwid
+from roadLoc import roadLoc, Route, Arc, routes
+
+## regions already loaded, by (route1, route2, resolution, bounds, sizes)
+_cache = {}
+
+def _geometryHash(route, bounds):
+    """ crc32 of a route's segment parameters and of its (x, y, angle) at
+        every meter within bounds, the latter covers arcs' heading functions """
+    if not isinstance(route, Route):
+        route = routes[route]
+    values = [route.breaks]
+    for segment in route.segments:
+        if isinstance(segment, Arc):
+            values += [segment.center, (segment.radius,), segment.radial,
+                       segment.tangent, (segment.length,)]
+        else:
+            values += [segment.start, segment.direction, (segment.length,)]
+    values += [roadLoc(np.arange(bounds[0], bounds[1] + .5), route).ravel()]
+    values = np.concatenate([np.asarray(value, dtype=float).ravel()
+                             for value in values])
+    return zlib.crc32(values.tobytes()) & 0xffffffff
+
+def _rectangles(grid):
+    """ Merges the True cells of a 2D boolean grid into disjoint rectangles,
+        returned as rows of [first row, last row+1, first col, last col+1].
+        Each row's runs of True cells are found, then identical runs in
+        consecutive rows are joined. """
+    rectangles = []
+    active = {} # run -> first row it appeared in
+    padded = np.zeros((grid.shape[0]+1, grid.shape[1]+2), dtype=bool)
+    padded[:-1,1:-1] = grid
+    for row in range(padded.shape[0]):
+        changes = np.flatnonzero(np.diff(padded[row].astype(int)))
+        runs = set(zip(changes[::2], changes[1::2]))
+        for run in list(active):
+            if run not in runs:
+                rectangles += [[active.pop(run), row, run[0], run[1]]]
+        for run in runs:
+            if run not in active:
+                active[run] = row
+    return np.array(rectangles, dtype=int).reshape((-1,4))
+
+def _grid(route1, route2, edges1, edges2, sizes):
+    """ Whether the vehicles collide at the center of each cell """
+    centers1 = (edges1[:-1] + edges1[1:]) / 2.
+    centers2 = (edges2[:-1] + edges2[1:]) / 2.
+    xy1 = roadLoc(centers1, route1)
+    xy2 = roadLoc(centers2, route2)
+    grid = collisionCheck(np.repeat(xy1, centers2.shape[0], 0),
+                          np.tile(xy2, (centers1.shape[0],1)), *sizes)
+    return grid.reshape((centers1.shape[0], centers2.shape[0]))
+
+def computeRegion(route1, route2, resolution=.05, bounds=(-50., 50.),
+                  sizes=(Vlen, Vwid, Vlen, Vwid), coarseResolution=.5):
+    """ Returns arrays lo1, hi1, lo2, hi2 of the colliding rectangles.
+        sizes = length and width of vehicle 1, then of vehicle 2
+        A grid with coarseResolution first finds roughly where the region is,
+        so that only that area is checked at the full resolution. """
+    edges = np.arange(bounds[0], bounds[1] + coarseResolution/2.,
+                      coarseResolution)
+    coarse = _grid(route1, route2, edges, edges, sizes)
+    rows = np.flatnonzero(np.any(coarse, axis=1))
+    cols = np.flatnonzero(np.any(coarse, axis=0))
+    if rows.shape[0] == 0:
+        return (np.zeros((0,)),)*4
+    # one coarse cell of margin on each side
+    edges1 = np.arange(edges[max(rows[0]-1, 0)],
+                       edges[min(rows[-1]+2, edges.shape[0]-1)] + resolution/2.,
+                       resolution)
+    edges2 = np.arange(edges[max(cols[0]-1, 0)],
+                       edges[min(cols[-1]+2, edges.shape[0]-1)] + resolution/2.,
+                       resolution)
+    rectangles = _rectangles(_grid(route1, route2, edges1, edges2, sizes))
+    return (edges1[rectangles[:,0]], edges1[rectangles[:,1]],
+            edges2[rectangles[:,2]], edges2[rectangles[:,3]])
+
+def getRegion(route1, route2, resolution=.05, bounds=(-50., 50.),
+              sizes=(Vlen, Vwid, Vlen, Vwid), storedir='regions'):
+    """ computeRegion, loading from or saving to storedir if given
+        Regions are stored under the routes' names and geometry, and vehicle
+        sizes. """
+    name1 = route1.name if isinstance(route1, Route) else route1
+    name2 = route2.name if isinstance(route2, Route) else route2
+    hash1 = _geometryHash(route1, bounds)
+    hash2 = _geometryHash(route2, bounds)
+    sizes = tuple(float(size) for size in sizes)
+    key = (name1, hash1, name2, hash2, resolution, tuple(bounds), sizes)
+    if key in _cache:
+        return _cache[key]
+    filename = None
+    if storedir is not None:
+        filename = '{:s}_{:s}_{:08x}{:08x}_{:g}_{:g}_{:g}'.format(name1, name2,
+                                hash1, hash2, resolution, bounds[0], bounds[1])
+        if sizes != (Vlen, Vwid, Vlen, Vwid):
+            filename += '_{:g}x{:g}_{:g}x{:g}'.format(*sizes)
+        filename = os.path.join(storedir, filename + '.npz')
+    if filename is not None and os.path.exists(filename):
+        stored = np.load(filename)
+        region = (stored['lo1'], stored['hi1'], stored['lo2'], stored['hi2'])
+    else:
+        region = computeRegion(route1, route2, resolution, bounds, sizes)
+        if filename is not None:
+            if not os.path.isdir(storedir):
+                os.makedirs(storedir)
+            np.savez(filename, lo1=region[0], hi1=region[1], lo2=region[2],
+                     hi2=region[3])
+    _cache[key] = region
+    return region
+
+
+if __name__ == '__main__':
+    for route1, route2 in (('left-right', 'right-down'),
+                           ('left-right', 'down-up'),
+                           ('down-up', 'right-down')):
+        lo1, hi1, lo2, hi2 = computeRegion(route1, route2)
+        print("{:s} & {:s}: {:d} rectangles, d1 {:.2f} to {:.2f}, "
+              "d2 {:.2f} to {:.2f}".format(route1, route2, lo1.shape[0],
+               np.min(lo1), np.max(hi1), np.min(lo2), np.max(hi2)))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Random initial states of the vehicle pairs in each scenario, shared by the
+simulate_X scripts and benchmark.py.
+
+Each vehicle is started within a certain coordinate range, then moved
+backwards for timeback seconds. The uncertainty in each initial state is
+Gaussian with the given covariance. The motion models and timesteps are up to
+the caller.
+rng = RandomState, or the np.random module
+"""
+import numpy as np
+import motionModels
+
+
+def lineVehicles(nsims, timeback, initialcovariance, rng=np.random):
+    """ The left turn scenario of simulate_1 and simulate_2, for MM_LineCV
+        vehicles on the 'left-right' and 'right-down' routes """
+    v1 = rng.normal(10., 5., nsims)
+    x1 = rng.normal(5, 2., nsims) - timeback * v1
+    v2 = rng.normal(10., 5., nsims)
+    x2 = rng.normal(-5, 2., nsims) - timeback * v2
+    vehicles1 = [motionModels.initialState_normal(veh, initialcovariance)
+                 for veh in np.array((x1,v1)).T]
+    vehicles2 = [motionModels.initialState_normal(veh, initialcovariance)
+                 for veh in np.array((x2,v2)).T]
+    return vehicles1, vehicles2
+
+def bicycleVehicles(nsims, timeback, initialnoise, rng=np.random):
+    """ The random bicycle model scenario of simulate_3 """
+    vehicles = []
+    for k in range(2):
+        a = rng.normal(0., 1., nsims)
+        w = rng.uniform(-.5, .5, nsims)
+        v = rng.normal(10., 5., nsims) - timeback * a
+        th = rng.uniform(-np.pi, np.pi, nsims)
+        x = rng.normal(0., 5., nsims) - timeback * v * np.cos(th)
+        y = rng.normal(0., 5., nsims) - timeback * v * np.sin(th)
+        vehicles += [[motionModels.initialState_normal(veh, initialnoise)
+                      for veh in np.array((x,y,th,v,a,w)).T]]
+    return vehicles[0], vehicles[1]
@@ -34,6 +34,7 @@ class MM_LineCV():
         N = noiseMatrix
         
         state = [displacement, velocity]
+        route = name of a route in roadLoc, or a roadLoc.Route
         noiseMatrix = per-second variance in motion equation """
         
     def __init__(self, route, noiseMatrix):
@@ -138,11 +139,17 @@ class MM_Bicycle():
             
         
 class initialState_normal():
-    """ The vehicle's current state X_0 is normally distributed. """
+    """ The vehicle's current state X_0 is normally distributed.
+        length, width = optional size of the vehicle, if not given the alarms
+                        use collisionCheck's default size """
     
-    def __init__(self, mean, cov):
+    def __init__(self, mean, cov, length=None, width=None):
         self.mean = mean
         self.cov = cov
+        if length is not None:
+            self.length = length
+        if width is not None:
+            self.width = width
         chol = np.linalg.cholesky(cov).T
         utpoints, utweights = UT.getUTpoints(mean.shape[0])
         self.utpoints = np.tile(mean,(utpoints.shape[0],1)) + utpoints.dot(chol)
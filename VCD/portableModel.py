@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Saves trained regressors in a plain numpy format and evaluates them without
+scikit-learn. Pickled scikit-learn models only load with the version that
+saved them, and their predict() has a large overhead per call.
+
+Supported models:
+    MLPRegressor - the weight matrices and biases of each layer
+    DecisionTreeRegressor, GradientBoostingRegressor - every tree is flattened
+        into shared arrays of nodes (feature, threshold, left and right child,
+        value), and all rows are walked down all trees at once
+
+save(model, filename) writes a .npz file, load(filename) returns an object with
+a predict(X) method that matches the original model's.
+"""
+import numpy as np
+
+_activations = {'identity' : lambda x: x,
+                'relu' : lambda x: np.maximum(x, 0.),
+                'tanh' : np.tanh,
+                'logistic' : lambda x: 1. / (1. + np.exp(-x))}
+
+
+class MLP():
+    """ Multi-layer perceptron, as in sklearn.neural_network.MLPRegressor """
+
+    def __init__(self, coefs, intercepts, activation, out_activation):
+        self.coefs = coefs
+        self.intercepts = intercepts
+        self.activation = _activations[activation]
+        self.out_activation = _activations[out_activation]
+
+    def predict(self, X):
+        for layer in range(len(self.coefs) - 1):
+            X = self.activation(X.dot(self.coefs[layer]) +
+                                self.intercepts[layer])
+        X = self.out_activation(X.dot(self.coefs[-1]) + self.intercepts[-1])
+        return X[:,0]
+
+
+class Trees():
+    """ A sum of regression trees, as in sklearn's DecisionTreeRegressor
+        (one tree, no scaling) and GradientBoostingRegressor.
+        Nodes of every tree are stored in the same arrays, roots gives the
+        first node of each tree. Leaves have a left child of -1. """
+
+    def __init__(self, roots, left, right, feature, threshold, value,
+                 scale=1., offset=0.):
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.scale = scale
+        self.offset = offset
+
+    def predict(self, X):
+        nodes = np.tile(self.roots, (X.shape[0], 1))
+        rows = np.arange(X.shape[0])[:,None]
+        active = self.left[nodes] >= 0
+        while np.any(active):
+            goleft = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nextnodes = np.where(goleft, self.left[nodes], self.right[nodes])
+            nodes = np.where(active, nextnodes, nodes)
+            active = self.left[nodes] >= 0
+        return self.offset + self.scale * np.sum(self.value[nodes], axis=1)
+
+
+def _flattenTrees(trees):
+    """ Concatenates the node arrays of several sklearn trees. """
+    roots = []
+    left = []
+    right = []
+    feature = []
+    threshold = []
+    value = []
+    nnodes = 0
+    for tree in trees:
+        tree = tree.tree_
+        roots += [nnodes]
+        isleaf = tree.children_left < 0
+        left += [np.where(isleaf, -1, tree.children_left + nnodes)]
+        right += [np.where(isleaf, -1, tree.children_right + nnodes)]
+        feature += [np.where(isleaf, 0, tree.feature)]
+        threshold += [tree.threshold]
+        value += [tree.value[:,0,0]]
+        nnodes += tree.node_count
+    return {'roots' : np.array(roots), 'left' : np.concatenate(left),
+            'right' : np.concatenate(right), 'feature' : np.concatenate(feature),
+            'threshold' : np.concatenate(threshold),
+            'value' : np.concatenate(value)}
+
+def save(model, filename):
+    """ Writes a fitted sklearn regressor to filename (.npz) """
+    if hasattr(model, 'coefs_'):
+        arrays = dict(('coef_{:d}'.format(layer), coef)
+                      for layer, coef in enumerate(model.coefs_))
+        arrays.update(('intercept_{:d}'.format(layer), intercept)
+                      for layer, intercept in enumerate(model.intercepts_))
+        np.savez(filename, kind='MLP', activation=model.activation,
+                 out_activation=model.out_activation_,
+                 nlayers=len(model.coefs_), **arrays)
+    elif hasattr(model, 'estimators_'):
+        trees = model.estimators_[:,0]
+        arrays = _flattenTrees(trees)
+        # the initial estimate is whatever is left after the trees' sum
+        x = np.zeros((1, trees[0].tree_.n_features))
+        treesum = sum(tree.predict(x)[0] for tree in trees)
+        offset = model.predict(x)[0] - model.learning_rate * treesum
+        np.savez(filename, kind='Trees', scale=model.learning_rate,
+                 offset=offset, **arrays)
+    elif hasattr(model, 'tree_'):
+        np.savez(filename, kind='Trees', scale=1., offset=0.,
+                 **_flattenTrees([model]))
+    else: raise Exception
+
+def load(filename):
+    """ Returns the model saved in filename, which has a predict(X) method """
+    arrays = np.load(filename)
+    kind = str(arrays['kind'])
+    if kind == 'MLP':
+        nlayers = int(arrays['nlayers'])
+        return MLP([arrays['coef_{:d}'.format(layer)]
+                        for layer in range(nlayers)],
+                   [arrays['intercept_{:d}'.format(layer)]
+                        for layer in range(nlayers)],
+                   str(arrays['activation']), str(arrays['out_activation']))
+    elif kind == 'Trees':
+        return Trees(arrays['roots'], arrays['left'], arrays['right'],
+                     arrays['feature'], arrays['threshold'], arrays['value'],
+                     float(arrays['scale']), float(arrays['offset']))
+    else: raise Exception
@@ -4,8 +4,9 @@
 Very similar to regressor_1, which has more explanation.
 """
 
-import alarms, motionModels
+import alarms, motionModels, truthTable, portableModel
 import numpy as np
+import os
 from sklearn.model_selection import train_test_split
 from scoring import AUC,ROC
 from sklearn.neural_network import MLPRegressor
@@ -14,6 +15,9 @@ from sklearn.tree import DecisionTreeRegressor
 import time
 
 model_name = 'sim_2'
+## simulations are stored under this name by truthTable, along with other
+## regressors' simulations of the same scenario
+scenario_name = 'lineCV_left-right_right-down_noise1e-5_2.5s'
 
 mean_means = np.array((-20, 10))
 mean_bounds = np.array((40, 25))
@@ -25,10 +29,19 @@ timelen = 2.5
 times = np.zeros((int(timelen/timeres),)) + timeres
 
 
-def createTruth(npoints, nrepeats=4000):
+def simulatePoint(state, nrepeats):
+    """ The probability of collision given both vehicles' mean initial state,
+        [displacement1, velocity1, displacement2, velocity2] """
+    mean1 = motionModels.initialState_normal(state[:2], noise*.1)
+    mean2 = motionModels.initialState_normal(state[2:4], noise*.1)
+    out = alarms.alarm_MCS(mean1, mean2, truthMM1, truthMM2, times, nrepeats)
+    return out[0]
+
+def createTruth(npoints, nrepeats=4000, nworkers=None):
     """
     Generates a range of initial states for both vehicles, then simulates from
-    each one a certain number of times.
+    each one a certain number of times. The simulation is split across
+    nworkers processes and can be resumed, see the truthTable module.
     """
     ## generating a grid of features
     res = int(npoints**.25)
@@ -40,17 +53,10 @@ def createTruth(npoints, nrepeats=4000):
     ## randomly generating features
     #X_0 = np.random.uniform(-1,1,size=(npoints,4))
     
-    y_0 = []
-    for point in range(npoints):
-        x = X_0[point,:]
-        mean1 = x[:2] * mean_bounds + mean_means
-        mean1 = motionModels.initialState_normal(mean1, noise*.1)
-        mean2 = x[2:4] * mean_bounds + mean_means
-        mean2 = motionModels.initialState_normal(mean2, noise*.1)
-        out = alarms.alarm_MCS(mean1, mean2, truthMM1, truthMM2, times,
-                                    nrepeats)
-        y_0 += [out[0]]
-    y_0 = np.array(y_0)
+    states = np.append(X_0[:,:2] * mean_bounds + mean_means,
+                       X_0[:,2:4] * mean_bounds + mean_means, axis=1)
+    y_0 = truthTable.generate(scenario_name, states, simulatePoint, nrepeats,
+                              nworkers=nworkers)
     
     np.save(model_name+'_X.npy', X_0)
     np.save(model_name+'_Y.npy',y_0)
@@ -117,8 +123,11 @@ def trainModels():
     dt.predict(X_0[:100])
     print "runtime for 100 samples "+str( time.time()-ff )
     
-    ## only saved MLP
+    ## only pickled MLP, all three are saved in the portable format
     np.save(model_name+'_MLP.npy',mlp)
+    portableModel.save(mlp, model_name+'_MLP.npz')
+    portableModel.save(gbr, model_name+'_GBR.npz')
+    portableModel.save(dt, model_name+'_DT.npz')
     
     
 class Model():
@@ -128,7 +137,11 @@ class Model():
     """
     
     def __init__(self, name='MLP'):
-        self.model=np.load(model_name+'_'+name+'.npy').item()
+        ## the portable format doesn't need sklearn, use it if it was saved
+        if os.path.exists(model_name+'_'+name+'.npz'):
+            self.model = portableModel.load(model_name+'_'+name+'.npz')
+        else:
+            self.model=np.load(model_name+'_'+name+'.npy').item()
         
     def alarm(self, vehicle1, vehicle2, MM1, MM2, times):
         """input and output match that of the functions in alarms.py"""
@@ -138,6 +151,19 @@ class Model():
         x[0,2:4] = (vehicle2.mean[:2] - mean_means) / mean_bounds
         pred = self.model.predict(x)[0]
         return (min(max(pred,0.),1.) , time.time() - starttime)
+        
+    def alarm_batch(self, vehicles1, vehicles2, MM1, MM2, times):
+        """scores many pairs of vehicles with one call to the model
+        input and output match alarms.alarm_MCS_batch"""
+        starttime = time.time()
+        X = np.empty((len(vehicles1), 4))
+        X[:,:2] = (np.array([vehicle.mean[:2] for vehicle in vehicles1]) -
+                        mean_means) / mean_bounds
+        X[:,2:4] = (np.array([vehicle.mean[:2] for vehicle in vehicles2]) -
+                        mean_means) / mean_bounds
+        pred = np.minimum(np.maximum(self.model.predict(X), 0.), 1.)
+        runtime = (time.time() - starttime) / len(vehicles1)
+        return [(float(prob), runtime) for prob in pred]
       
         
 """ uncomment createTruth or trainModels() to easily run from the command line.
@@ -11,8 +11,9 @@ motion models will likely have many variables or knobs and thus have a similarly
 high feature count.
 """
 
-import alarms, motionModels
+import alarms, motionModels, truthTable, portableModel
 import numpy as np
+import os
 import time
 from sklearn.model_selection import train_test_split
 from sklearn.neural_network import MLPRegressor
@@ -21,12 +22,17 @@ from sklearn.tree import DecisionTreeRegressor
 from scoring import AUC,ROC
 
 model_name = 'sim_3'
+## simulations are stored under this name by truthTable
+scenario_name = 'bicycle_noise1_1s'
 
 timeres = .1
 timelen = 1.
 times = np.zeros((int(timelen/timeres),)) + timeres
 mean_bounds = np.array((20, 20, np.pi, 30, 3, np.pi/2))
 stdev_bounds = np.diag((10, 10, np.pi / 3**.5, 5, 1, np.pi/4)) / 4.
+noise = np.diag([1., 1., .5, .1, 0.05, 0.01])
+truthMM1 = motionModels.MM_Bicycle(noise)
+truthMM2 = motionModels.MM_Bicycle(noise)
 
 
 def randomCovarianceMatrix(ndim):
@@ -42,17 +48,35 @@ def randomCovarianceMatrix(ndim):
     return newmat
     
     
-def createTruth(npoints, nrepeats=4000):
+def simulatePoint(state, nrepeats):
+    """ The probability of collision given both vehicles' initial mean (6
+        values each) and the upper triangle of their covariance (21 values
+        each), in the order mean1, cov1, mean2, cov2. """
+    upper = np.triu_indices(6)
+    cov1 = np.zeros((6,6))
+    cov1[upper] = state[6:27]
+    cov1 = cov1 + cov1.T - np.diag(np.diag(cov1))
+    cov2 = np.zeros((6,6))
+    cov2[upper] = state[33:54]
+    cov2 = cov2 + cov2.T - np.diag(np.diag(cov2))
+    veh1 = motionModels.initialState_normal(state[:6], cov1)
+    veh2 = motionModels.initialState_normal(state[27:33], cov2)
+    out = alarms.alarm_MCS(veh1, veh2, truthMM1, truthMM2, times, nrepeats)
+    return out[0]
+
+def createTruth(npoints, nrepeats=4000, nworkers=None, seed=0):
     """
     It can take a very long time to generate this data - 1 million points will
-    take a day on a good desktop.
+    take a day on a good desktop. The simulation is split across nworkers
+    processes and can be resumed, see the truthTable module. The features are
+    random, so the same seed must be used to resume.
     
     We keep the first vehicle at coordinate (0, 0) to lower the dimensionality.
     Hypothetically you can also adjust the angles so that the first vehicle is
     always facing one direction, but the distribution is no longer normal
     and the covariances are complicated to transform.
     """
-
+    np.random.seed(seed)
     means1 = np.random.uniform(-1., 1., size=(npoints, 4))
     covmats1 = np.empty((npoints,6,6))
     for point in range(npoints):
@@ -68,20 +92,17 @@ def createTruth(npoints, nrepeats=4000):
                           covmats2[:,1,1:], covmats2[:,2,2:], covmats2[:,3,3:],
                           covmats2[:,4,4:], covmats2[:,5,5:]), axis=1)
     
-    y_0 = []
-    noise = np.diag([1., 1., .5, .1, 0.05, 0.01])
-    MM1 = motionModels.MM_Bicycle(noise)
-    MM2 = motionModels.MM_Bicycle(noise)
+    upper = np.triu_indices(6)
+    states = np.empty((npoints, 54))
     for point in range(npoints):
-        mean1 = np.append([0,0], means1[point,:] * mean_bounds[2:])
+        states[point,:6] = np.append([0,0], means1[point,:] * mean_bounds[2:])
         cov1 = stdev_bounds.dot(covmats1[point,:,:]).dot(stdev_bounds)
-        mean2 = means2[point,:] * mean_bounds
+        states[point,6:27] = cov1[upper]
+        states[point,27:33] = means2[point,:] * mean_bounds
         cov2 = stdev_bounds.dot(covmats2[point,:,:]).dot(stdev_bounds)
-        veh1 = motionModels.initialState_normal(mean1,cov1,False)
-        veh2 = motionModels.initialState_normal(mean2,cov2,False)
-        out = alarms.alarm_particle(veh1, veh2, MM1, MM2, times, nrepeats)
-        y_0 += [out[0]]
-    y_0 = np.array(y_0)
+        states[point,33:] = cov2[upper]
+    y_0 = truthTable.generate(scenario_name, states, simulatePoint, nrepeats,
+                              nworkers=nworkers, seed=seed)
     
     np.save(model_name+'_X.npy', X_0)
     np.save(model_name+'_Y.npy',y_0)
@@ -139,26 +160,43 @@ def trainModels():
     print "runtime for 100 samples "+str( time.time()-ff )
     
     np.save(model_name+'_MLP.npy',mlp)
+    portableModel.save(mlp, model_name+'_MLP.npz')
     
 class Model():
     def __init__(self, name='MLP'):
-        self.model=np.load(model_name+'_'+name+'.npy').item()
+        ## the portable format doesn't need sklearn, use it if it was saved
+        if os.path.exists(model_name+'_'+name+'.npz'):
+            self.model = portableModel.load(model_name+'_'+name+'.npz')
+        else:
+            self.model=np.load(model_name+'_'+name+'.npy').item()
         self.stdev = np.diag(1./np.diagonal(stdev_bounds))
-    def alarm_model(self, vehicle1, vehicle2, MM1, MM2, times):
-        starttime = time.time()
-        x = np.array([[0.]*52])
+    def features(self, vehicle1, vehicle2):
+        x = np.zeros((52,))
         mean1 = vehicle1.mean
         mean2 = vehicle2.mean.copy()
         mean2[:2] = mean2[:2] - mean1[:2]
-        x[0,:4] = mean1[2:] / mean_bounds[2:]
-        x[0,25:31] = mean2 / mean_bounds
+        x[:4] = mean1[2:] / mean_bounds[2:]
+        x[25:31] = mean2 / mean_bounds
         cov1 = self.stdev.dot(vehicle1.cov).dot(self.stdev)
-        x[0,4:25] = np.concatenate((cov1[0,:],cov1[1,1:],cov1[2,2:],
+        x[4:25] = np.concatenate((cov1[0,:],cov1[1,1:],cov1[2,2:],
                                 cov1[3,3:],cov1[4,4:],cov1[5,5:]),axis=0)
         cov1 = self.stdev.dot(vehicle2.cov).dot(self.stdev)
-        x[0,31:] = np.concatenate((cov1[0,:],cov1[1,1:],cov1[2,2:],
+        x[31:] = np.concatenate((cov1[0,:],cov1[1,1:],cov1[2,2:],
                                 cov1[3,3:],cov1[4,4:],cov1[5,5:]),axis=0)
+        return x
+    def alarm_model(self, vehicle1, vehicle2, MM1, MM2, times):
+        starttime = time.time()
+        x = self.features(vehicle1, vehicle2)[None,:]
         return (self.model.predict(x)[0] , time.time() - starttime)
+    def alarm_batch(self, vehicles1, vehicles2, MM1, MM2, times):
+        """ scores many pairs of vehicles with one call to the model
+        input and output match alarms.alarm_MCS_batch """
+        starttime = time.time()
+        X = np.array([self.features(vehicle1, vehicle2) for vehicle1, vehicle2
+                      in zip(vehicles1, vehicles2)])
+        pred = self.model.predict(X)
+        runtime = (time.time() - starttime) / len(vehicles1)
+        return [(float(prob), runtime) for prob in pred]
         
 if __name__=='__main__':
     pass
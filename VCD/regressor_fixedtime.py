@@ -10,6 +10,8 @@ in training) will require a great deal of computational resources.
 
 from collisionCheck import check as collisionCheck
 import numpy as np
+import truthTable, portableModel
+import os
 from sklearn.model_selection import train_test_split
 from scoring import AUC,ROC
 from sklearn.neural_network import MLPRegressor
@@ -18,6 +20,8 @@ from sklearn.tree import DecisionTreeRegressor
 import time
 
 model_name = 'step'
+## simulations are stored under this name by truthTable
+scenario_name = 'step_normal'
 
 xy_bound = 15
 std_xy_bound = 10
@@ -30,10 +34,25 @@ def rectify(theta):
     theta[theta < -np.pi] += 2*np.pi
     return theta
 
-def createTruth(npoints, nrepeats=3000):
+def simulatePoint(state, nrepeats):
+    """ The probability of collision when the other car's x, y, and both cars'
+        angles are normally distributed, with
+        state = [mean x, mean y, mean angle 1, mean angle 2,
+                 std x, std y, std angle 1, std angle 2] """
+    egocar = np.zeros((nrepeats,3))
+    altcar = np.zeros((nrepeats,3))
+    samples = np.random.normal(size=(4,nrepeats))
+    altcar[:,0] = state[0] + state[4] * samples[0]
+    altcar[:,1] = state[1] + state[5] * samples[1]
+    egocar[:,2] = rectify(state[2] + state[6] * samples[2])
+    altcar[:,2] = rectify(state[3] + state[7] * samples[3])
+    return float(np.sum(collisionCheck(egocar, altcar)))/nrepeats
+
+def createTruth(npoints, nrepeats=3000, nworkers=None):
     """
     Generates a range of initial states for both vehicles, then simulates from
-    each one a certain number of times.
+    each one a certain number of times. The simulation is split across
+    nworkers processes and can be resumed, see the truthTable module.
     """
     ## generating a grid of features
     ndim = 8
@@ -50,20 +69,10 @@ def createTruth(npoints, nrepeats=3000):
 #    X_0 = np.random.uniform(-1,1,size=(npoints,4))
 #    X_0 = np.append(X_0, np.random.uniform(0,1,size=(npoints,4)),axis=1)
     
-    egocar = np.zeros((nrepeats,3))
-    altcar = np.zeros((nrepeats,3))
-    samples = np.random.normal(size=(4,nrepeats))
-    
-    y_0 = np.empty((npoints,))
-    for point in range(npoints):
-        feats = X_0[point,:]
-        altcar[:,0] = feats[0] * xy_bound + std_xy_bound * feats[4] * samples[0]
-        altcar[:,1] = feats[1] * xy_bound + std_xy_bound * feats[5] * samples[1]
-        angle = feats[2] * np.pi + std_angle_bound * feats[6] * samples[2]
-        egocar[:,2] = rectify(angle)
-        angle = feats[3] * np.pi + std_angle_bound * feats[7] * samples[3]
-        altcar[:,2] = rectify(angle)
-        y_0[point] = np.sum(collisionCheck(egocar, altcar))/nrepeats
+    scales = np.array((xy_bound, xy_bound, np.pi, np.pi, std_xy_bound,
+                       std_xy_bound, std_angle_bound, std_angle_bound))
+    y_0 = truthTable.generate(scenario_name, X_0 * scales, simulatePoint,
+                              nrepeats, nworkers=nworkers)
     
     np.save(model_name+'_X.npy', X_0)
     np.save(model_name+'_Y.npy',y_0)
@@ -129,8 +138,11 @@ def trainModels():
     dt.predict(X_0[:100])
     print( "runtime for 100 samples: {:.1e}".format( time.time()-ff ))
     
-    ## only saved MLP
+    ## only pickled MLP, all three are saved in the portable format
     np.save(model_name+'_MLP.npy',mlp)
+    portableModel.save(mlp, model_name+'_MLP.npz')
+    portableModel.save(gbr, model_name+'_GBR.npz')
+    portableModel.save(dt, model_name+'_DT.npz')
     
     
 class Model():
@@ -140,15 +152,18 @@ class Model():
     """
     
     def __init__(self, name='MLP'):
-        self.model=np.load(model_name+'_'+name+'.npy').item()
+        ## the portable format doesn't need sklearn, use it if it was saved
+        if os.path.exists(model_name+'_'+name+'.npz'):
+            self.model = portableModel.load(model_name+'_'+name+'.npz')
+        else:
+            self.model=np.load(model_name+'_'+name+'.npy').item()
         self.bin = np.zeros((0,8))
         
-    def alarm(self, vehicle1, vehicle2, MM1, MM2, times):
-        """input and output match that of the functions in alarms.py"""
+    def features(self, vehicle1, vehicle2, MM1, MM2, times):
+        """one row of features for each timestep"""
         MM1weights = MM1.weights
         MM2weights = MM2.weights
         
-        starttime = time.time()
         v1 = vehicle1.utpoints
         v2 = vehicle2.utpoints
         features = np.empty((len(times),8))
@@ -182,11 +197,31 @@ class Model():
                               (y1std+y2std)**.5 / std_xy_bound,
                               th1std / std_angle_bound,
                               th2std / std_angle_bound ]
+        return features
+        
+    def alarm(self, vehicle1, vehicle2, MM1, MM2, times):
+        """input and output match that of the functions in alarms.py"""
+        starttime = time.time()
+        features = self.features(vehicle1, vehicle2, MM1, MM2, times)
         pred = self.model.predict(features)
         pred = np.max(pred)
         endtime = time.time() - starttime
         self.bin = np.append(self.bin, features, axis=0)
         return (min(max(pred,0.),1.) , endtime)
+        
+    def alarm_batch(self, vehicles1, vehicles2, MM1, MM2, times):
+        """scores many pairs of vehicles with one call to the model
+        input and output match alarms.alarm_MCS_batch"""
+        starttime = time.time()
+        features = np.concatenate([self.features(vehicle1, vehicle2, MM1, MM2,
+                                                 times) for vehicle1, vehicle2
+                                   in zip(vehicles1, vehicles2)], axis=0)
+        pred = self.model.predict(features).reshape((len(vehicles1),
+                                                     len(times)))
+        pred = np.minimum(np.maximum(np.max(pred, axis=1), 0.), 1.)
+        endtime = (time.time() - starttime) / len(vehicles1)
+        self.bin = np.append(self.bin, features, axis=0)
+        return [(float(prob), endtime) for prob in pred]
       
         
 """ uncomment createTruth or trainModels() to easily run from the command line
@@ -3,52 +3,143 @@
 The simulated road environment is directly based off of a four-way, two-lane
 cross intersection the open source traffic simulator SUMO.
 <http://sumo.dlr.de/wiki/Simulation_of_Urban_MObility_-_Wiki>
-Instead of interfacing with SUMO, the equations relating road position to 
+Instead of interfacing with SUMO, the equations relating road position to
 physical coordinates were handcoded for maximum speed.
+
+A route is a sequence of segments, each covering a range of positions along
+the route:
+    Line - straight road, (x,y) = start + direction * position
+    Arc - circular road around a center point
+The first and last segments extend forever. Routes can be built from the
+segments directly, or from a polyline with polylineRoute(). roadLoc accepts
+either a Route or the name of one of the routes in the routes dict.
 """
 import numpy as np
 
-def roadLoc(pos, route):
-    if type(pos) == np.ndarray:
+
+class Line():
+    """ (x,y) = start + direction * pos, where pos is the position along the
+        whole route, so start is where the line would be at position 0.
+        length = the length of this segment, ignored for the last segment """
+    def __init__(self, start, direction, length=np.inf):
+        self.start = start
+        self.direction = direction
+        self.angle = np.arctan2(direction[1], direction[0])
+        self.length = length
+
+
+class Arc():
+    """ Circular segment, with p the distance traveled along the arc:
+        (x,y) = center + radius * (radial * cos(p/radius) +
+                                   tangent * sin(p/radius))
+        radial = unit vector from the center to the start of the arc
+        tangent = unit vector of the direction of travel at the start
+        heading = optional function of p giving the vehicle's angle, by default
+                  it follows the circle """
+    def __init__(self, center, radius, radial, tangent, length, heading=None):
+        self.center = center
+        self.radius = radius
+        self.radial = radial
+        self.tangent = tangent
+        self.length = length
+        if heading is None:
+            turn = np.sign(radial[0]*tangent[1] - radial[1]*tangent[0])
+            startangle = np.arctan2(tangent[1], tangent[0])
+            heading = lambda p: startangle + turn * p / radius
+        self.heading = heading
+
+
+class Route():
+    """ segments = Line and Arc objects in order of travel
+        start = position at which the second segment begins """
+    def __init__(self, name, segments, start=0.):
+        self.name = name
+        self.segments = segments
+        self.breaks = np.cumsum([start] + [segment.length
+                                           for segment in segments[1:-1]])
+        self.starts = np.append(-np.inf, self.breaks)
+        lines = [i for i, segment in enumerate(segments)
+                 if isinstance(segment, Line)]
+        self.arcs = [i for i, segment in enumerate(segments)
+                     if isinstance(segment, Arc)]
+        # line parameters, gathered by segment index
+        self.x0 = np.zeros(len(segments))
+        self.y0 = np.zeros(len(segments))
+        self.dx = np.zeros(len(segments))
+        self.dy = np.zeros(len(segments))
+        self.angle = np.zeros(len(segments))
+        for i in lines:
+            self.x0[i], self.y0[i] = segments[i].start
+            self.dx[i], self.dy[i] = segments[i].direction
+            self.angle[i] = segments[i].angle
+
+    def locate(self, pos):
+        """ pos = array of positions, returns array of [x, y, angle] """
         xya = np.empty((pos.shape[0],3))
-        if route == 'left-right':
-            xya[:,0] = pos
-            xya[:,1] = -5.
-            xya[:,2] = 0.
-        elif route == 'down-up':
-            xya[:,0] = 5.
-            xya[:,1] = pos
-            xya[:,2] = np.pi/2.
-        elif route == 'right-down':
-            before = pos <= -8.
-            after = pos > 7.15818455
-            within = (before | after) == False
-            xya[before,0] = -pos[before]
-            xya[before,1] = 1.65
-            xya[before,2] = np.pi
-            xya[after,0] = -1.65
-            xya[after,1] = -.8418154464 - pos[after]
-            xya[after,2] = -np.pi/2.
-            r = 9.65
-            p = pos[within] + 8.
-            xya[within,0] = 8. - r*np.sin(p/r)
-            xya[within,1] = -8. + r*np.cos(p/r)
-            xya[within,2] = p*.07792350162 - np.sin(p*.3116940065)*.2 - np.pi
-        else: raise Exception
+        if len(self.segments) == 1:
+            # a single line, only the coordinates that change are computed
+            for column, start, direction in ((0, self.x0[0], self.dx[0]),
+                                             (1, self.y0[0], self.dy[0])):
+                if direction == 0:
+                    xya[:,column] = start
+                elif direction == 1 and start == 0:
+                    xya[:,column] = pos
+                else:
+                    np.multiply(pos, direction, out=xya[:,column])
+                    xya[:,column] += start
+            xya[:,2] = self.angle[0]
+            return xya
+        segment = np.searchsorted(self.breaks, pos, side='left')
+        xya[:,0] = self.x0[segment] + self.dx[segment]*pos
+        xya[:,1] = self.y0[segment] + self.dy[segment]*pos
+        xya[:,2] = self.angle[segment]
+        for i in self.arcs:
+            arc = self.segments[i]
+            within = segment == i
+            p = pos[within] - self.starts[i]
+            sin = np.sin(p/arc.radius)
+            cos = np.cos(p/arc.radius)
+            xya[within,0] = arc.center[0] + arc.radius*(arc.radial[0]*cos +
+                                                         arc.tangent[0]*sin)
+            xya[within,1] = arc.center[1] + arc.radius*(arc.radial[1]*cos +
+                                                         arc.tangent[1]*sin)
+            xya[within,2] = arc.heading(p)
         return xya
+
+
+def polylineRoute(name, points, start=0.):
+    """ A route of straight lines through each of points, in order. The
+        position is start at the second point. """
+    points = np.asarray(points, dtype=float)
+    segments = []
+    position = start - np.hypot(*(points[1] - points[0]))
+    for k in range(points.shape[0] - 1):
+        length = np.hypot(*(points[k+1] - points[k]))
+        direction = (points[k+1] - points[k]) / length
+        segments.append(Line(tuple(points[k] - direction*position),
+                             tuple(direction), length))
+        position += length
+    return Route(name, segments, start)
+
+
+routes = {}
+routes['left-right'] = Route('left-right', [Line((0., -5.), (1., 0.))])
+routes['down-up'] = Route('down-up', [Line((5., 0.), (0., 1.))])
+routes['right-down'] = Route('right-down', [
+        Line((0., 1.65), (-1., 0.)),
+        Arc((8., -8.), 9.65, (0., 1.), (-1., 0.), 15.15818455,
+            lambda p: p*.07792350162 - np.sin(p*.3116940065)*.2 - np.pi),
+        Line((-1.65, -.8418154464), (0., -1.))], start=-8.)
+
+
+def roadLoc(pos, route):
+    """ (x, y, angle) of a vehicle at position pos along route
+        pos = scalar or array of positions
+        route = Route or name of a route in routes """
+    if not isinstance(route, Route):
+        if route not in routes: raise Exception
+        route = routes[route]
+    if type(pos) == np.ndarray:
+        return route.locate(pos)
     else:
-        if route == 'left-right':
-            return (pos, -5., 0.)
-        elif route == 'down-up':
-            return (5., pos, np.pi/2.)
-        elif route == 'right-down':
-            if pos <= -8.:
-                return (-pos, 1.65, np.pi)
-            elif pos > 7.15818455:
-                return (-1.65, -.8418154464 - pos, -np.pi/2.)
-            else:
-                r = 9.65
-                p = pos + 8.
-                return (8. - r*np.sin(p/r), -8. + r*np.cos(p/r),
-                        p*.07792350162 - np.sin(p*.3116940065)*.2 - np.pi)
-        else: raise Exception
\ No newline at end of file
+        return tuple(route.locate(np.array((pos,), dtype=float))[0])
@@ -13,11 +13,20 @@ import matplotlib.cm as cmx
 def totalFPR(truth,pred,cutoff):
     """ The expected False Positive Rate given predicted probabilities and a
         cutoff value. """
-    return sum(1-truth[pred>cutoff])/sum(1-truth)
+    return np.sum(1-truth[pred>cutoff])/np.sum(1-truth)
 def totalFNR(truth,pred,cutoff):
     """ The expected False Negative Rate given predicted probabilities and a
         cutoff value. """
-    return sum(truth[pred<=cutoff])/sum(truth)
+    return np.sum(truth[pred<=cutoff])/np.sum(truth)
+def rates(truth, pred, cutoffs):
+    """ totalFNR and totalFPR for an array of cutoffs, with one sort. """
+    order = np.argsort(pred, kind='mergesort')
+    below = np.searchsorted(pred[order], cutoffs, side='right')
+    positives = np.append(0., np.cumsum(truth[order]))
+    negatives = np.append(0., np.cumsum(1-truth[order]))
+    FNR = positives[below] / positives[-1]
+    FPR = (negatives[-1] - negatives[below]) / negatives[-1]
+    return FNR, FPR
 def worstFalsePositive(truth, pred, cutoff):
     """ Find the initial state for which the predicted probabilities and cutoff
         have the highest probability of False Positives."""
@@ -29,11 +38,17 @@ def worstFalseNegative(truth, pred, cutoff):
     if np.all(pred > cutoff): return 0.
     return np.max(truth[pred<=cutoff])
 def ROC(truth, pred):
-    """ Returns the sweep of false positive and negative rates. """
-    truth = truth[np.argsort(pred)]
-    FP = np.cumsum(1-np.flipud(truth)) / sum(1-truth)
-    FN = np.flipud(np.cumsum(truth)) / sum(truth)
-    return [np.append(0.,FP), np.append(FN,0.)]
+    """ Returns the sweep of false positive and negative rates.
+        Equal predictions are one threshold, so ties are counted as half right
+        rather than depending on the sort order. """
+    order = np.argsort(-pred, kind='mergesort')
+    pred = pred[order]
+    truth = truth[order]
+    # last element of each run of equal predictions
+    last = np.append(pred[1:] != pred[:-1], True)
+    TP = np.cumsum(truth)[last]
+    FP = np.cumsum(1-truth)[last]
+    return [np.append(0.,FP) / FP[-1], 1 - np.append(0.,TP) / TP[-1]]
 def AUC(FP, FN):
     """ Given a sweep across False Positive and Negative Rates, calculates the
         area under the Receiver Operating Characteristic. """
@@ -41,6 +56,50 @@ def AUC(FP, FN):
     fn = np.diff(1-FN)
     fn2 = 1 - FN[:-1]
     return np.sum(fp*(fn2+fn/2.))
+def rankAUC(truth, preds):
+    """ AUC(*ROC(truth, pred)) for each row of preds, from the rank statistic:
+        the chance that a collision's prediction is above a non-collision's,
+        with ties counting half, where truth gives each row's weight as a
+        collision (and 1-truth as a non-collision).
+        truth = array of true probabilities, either one per column of preds or
+                one per element of preds
+        All rows are scored together, without a loop over rows. """
+    preds = np.atleast_2d(preds)
+    truth = np.broadcast_to(truth, preds.shape)
+    nrows, ncols = preds.shape
+    order = np.argsort(preds, axis=1)
+    pred = np.take_along_axis(preds, order, 1).ravel()
+    positive = np.take_along_axis(truth, order, 1).ravel()
+    rows = np.repeat(np.arange(nrows), ncols)
+    # runs of equal predictions within each row
+    first = np.ones(pred.shape[0], dtype=bool)
+    first[1:] = (pred[1:] != pred[:-1]) | (rows[1:] != rows[:-1])
+    group = np.cumsum(first) - 1
+    grouprows = rows[first]
+    positives = np.bincount(group, weights=positive)
+    negatives = np.bincount(group, weights=1-positive)
+    # negative weight in lower groups of the same row
+    below = np.cumsum(negatives) - negatives
+    rowstarts = np.flatnonzero(np.append(True, grouprows[1:] !=
+                                          grouprows[:-1]))
+    below -= np.repeat(below[rowstarts], np.diff(np.append(rowstarts,
+                                                 grouprows.shape[0])))
+    wins = np.bincount(grouprows, weights=positives*(below + negatives/2.),
+                       minlength=nrows)
+    return wins / (np.bincount(grouprows, weights=positives, minlength=nrows) *
+                   np.bincount(grouprows, weights=negatives, minlength=nrows))
+def bootstrapAUC(truth, preds, nbootstrap=1000, interval=.95, seed=0):
+    """ Bootstrap confidence interval of rankAUC for each row of preds.
+        All rows use the same resamples, and each row's resamples are scored
+        together with rankAUC. Returns arrays of lower and upper bounds. """
+    preds = np.atleast_2d(preds)
+    rng = np.random.RandomState(seed)
+    resamples = rng.randint(preds.shape[1], size=(nbootstrap, preds.shape[1]))
+    truths = truth[resamples]
+    quantiles = [(1-interval)/2*100, (1+interval)/2*100]
+    bounds = np.array([np.percentile(rankAUC(truths, pred[resamples]),
+                                     quantiles) for pred in preds])
+    return bounds[:,0], bounds[:,1]
 def zCost(truth, pred, z):
     """ Calculates the Expected Cost as defined in the paper.
     
@@ -49,7 +108,8 @@ def zCost(truth, pred, z):
     # the cost of a false negative is z times the cost of a false positive
     # calculate total cost
     cutoff = 1./(z+1) # this is overapproximation in worst case
-    return (sum(1-truth[pred>cutoff]) + z*sum(truth[pred<=cutoff]))/truth.shape[0]
+    return (np.sum(1-truth[pred>cutoff]) +
+            z*np.sum(truth[pred<=cutoff]))/truth.shape[0]
     
     
 def plotROC(truth, results, savename=None):
@@ -59,7 +119,7 @@ def plotROC(truth, results, savename=None):
     colors = [cmx.viridis(x) for x in np.linspace(0.,1., len(results))]
     counter = 0
     for label, result in results.items():
-        preds = np.array([pred for pred, runtime in result])
+        preds = np.array([output[0] for output in result])
         FP,FN = ROC(truth, preds)
         plt.plot(FP, 1-FN, color=colors[counter], label=label)
         counter += 1
@@ -72,9 +132,14 @@ def plotROC(truth, results, savename=None):
 
         
 def bigTable(truth, results, savename=None, fp_fn_vals=[], worst_vals=[],
-             z_cost_vals=[]):
-    """ Gathers various scores for each alarm and puts them in a table. """
+             z_cost_vals=[], nbootstrap=0):
+    """ Gathers various scores for each alarm and puts them in a table.
+        Alarms that return a dict of diagnostics (for instance 'stderr') get
+        an extra column with the average of each diagnostic.
+        nbootstrap = if above 0, adds a 95% bootstrap interval for the AUC """
     criteria = ['AUC', 'avg runtime']
+    if nbootstrap > 0:
+        criteria += ['AUC 2.5%', 'AUC 97.5%']
     for fp_fn_val in fp_fn_vals:
         criteria += ['FNR @ cutoff='+str(fp_fn_val),
                      'FPR @ cutoff='+str(fp_fn_val)]
@@ -86,23 +151,50 @@ def bigTable(truth, results, savename=None, fp_fn_vals=[], worst_vals=[],
                      'FPR @ z='+str(z_cost_val),
                      'avg cost @ z='+str(z_cost_val)]
     
+    diagnostics = set()
+    for result in results.values():
+        for output in result:
+            if len(output) > 2:
+                diagnostics.update(output[2].keys())
+    diagnostics = sorted(diagnostics)
+    criteria += ['avg '+diagnostic for diagnostic in diagnostics]
+    
+    labels = list(results.keys())
+    allpreds = np.array([[output[0] for output in results[label]]
+                         for label in labels], dtype=float)
+    AUCs = rankAUC(truth, allpreds)
+    if nbootstrap > 0:
+        lower, upper = bootstrapAUC(truth, allpreds, nbootstrap)
+    cutoffs = np.array(list(fp_fn_vals) +
+                       [1./(1+z_cost_val) for z_cost_val in z_cost_vals])
+    z_cost_vals = np.array(z_cost_vals, dtype=float)
+    npositive = np.sum(truth)
+    nnegative = np.sum(1-truth)
+    
     results2 = {}
-    for label, result in results.items():
-        preds = np.array([pred for pred, runtime in result])
-        runtimes = [runtime for pred, runtime in result]
-        FP,FN = ROC(truth, preds)
+    for row, label in enumerate(labels):
+        result = results[label]
+        preds = allpreds[row]
+        runtimes = [output[1] for output in result]
         meanruntime = np.mean(runtimes)
-        result2 = [AUC(FP,FN) , meanruntime]
-        for fp_fn_val in fp_fn_vals:
-            result2 += [totalFNR(truth, preds, fp_fn_val),
-                        totalFPR(truth, preds, fp_fn_val)]
+        result2 = [AUCs[row] , meanruntime]
+        if nbootstrap > 0:
+            result2 += [lower[row], upper[row]]
+        FNR, FPR = rates(truth, preds, cutoffs)
+        for k in range(len(fp_fn_vals)):
+            result2 += [FNR[k], FPR[k]]
         for worst_val in worst_vals:
             result2 += [worstFalseNegative(truth, preds, worst_val),
                         worstFalsePositive(truth, preds, worst_val)]
-        for z_cost_val in z_cost_vals:
-            result2 += [totalFNR(truth, preds, 1./(1+z_cost_val)),
-                        totalFPR(truth, preds, 1./(1+z_cost_val)),
-                        zCost(truth, preds, z_cost_val)]
+        FNR = FNR[len(fp_fn_vals):]
+        FPR = FPR[len(fp_fn_vals):]
+        costs = (FPR*nnegative + z_cost_vals*FNR*npositive) / truth.shape[0]
+        for k in range(len(z_cost_vals)):
+            result2 += [FNR[k], FPR[k], costs[k]]
+        for diagnostic in diagnostics:
+            result2 += [np.mean([output[2][diagnostic] if len(output) > 2 and
+                                 diagnostic in output[2] else np.nan
+                                 for output in result])]
         results2[label] = result2
     results2 = pd.DataFrame(results2, index=criteria).transpose()
     if savename is not None:
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the simulations of a simulate_X module across a pool of processes.
+
+The simulations are split into shards by index (simulation k goes to shard
+k % nshards). Every process generates the scenario from the same seed, so all
+shards see the same vehicles, and before each alarm is run on a simulation the
+random generator is seeded from the simulation index and the alarm's label.
+An alarm's result for a simulation therefore does not depend on the number of
+shards or processes, or on which other alarms were run.
+
+Each shard's results are stored as a pickle file holding a dict of
+label -> list of alarm outputs, plus 'sims' -> the simulation indices. Labels
+that are already stored for a shard are not run again, so an interrupted run
+can be resumed, and adding an alarm to a module's alarmList only runs the new
+alarm. Alarms whose code changed can be run again with the rerun argument.
+The true probabilities are stored under 'optimal', from alarms.alarm_truth.
+
+The module must define scenario(nsims), alarmList(), MM1, MM2, times, see
+simulate_1.
+
+python simulateParallel.py simulate_1 --workers 8
+python simulateParallel.py simulate_1 --rerun "UT 2"
+"""
+import os
+import zlib
+import pickle
+import argparse
+import importlib
+import numpy as np
+from multiprocessing import Pool
+import alarms, scoring
+
+
+def simSeed(sim, label, seed=0):
+    """ A random seed determined by the simulation index and alarm label """
+    return (zlib.crc32('{:d} {:s}'.format(sim, label).encode()) ^ seed) \
+                & 0xffffffff
+
+def _shardFile(module, shard, nshards, nsims, seed, storedir):
+    return os.path.join(storedir, '{:s}_{:d}_{:d}'.format(module, nsims, seed),
+                        'shard_{:04d}_of_{:04d}.pkl'.format(shard, nshards))
+
+def loadShard(filename):
+    """ The stored results of one shard, or None """
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as fileobj:
+        return pickle.load(fileobj)
+
+def _saveShard(filename, results):
+    """ Writes under a temporary name, then renames, so a shard file is never
+        half-written. """
+    folder = os.path.dirname(filename)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(filename + '.tmp', 'wb') as fileobj:
+        pickle.dump(results, fileobj, protocol=2)
+    os.rename(filename + '.tmp', filename)
+
+def _runShard(args):
+    module, shard, nshards, nsims, seed, storedir, rerun = args
+    filename = _shardFile(module, shard, nshards, nsims, seed, storedir)
+    results = loadShard(filename)
+    sims = np.arange(shard, nsims, nshards)
+    if results is None:
+        results = {'sims' : sims}
+    simulation = importlib.import_module(module)
+    alarmlist = [('optimal', alarms.alarm_truth)] + simulation.alarmList()
+    alarmlist = [(label, alarm) for label, alarm in alarmlist
+                 if label in rerun or label not in results]
+    if len(alarmlist) == 0:
+        return shard, []
+    np.random.seed(seed)
+    vehicles1, vehicles2 = simulation.scenario(nsims)
+    for label, alarm in alarmlist:
+        result = []
+        for sim in sims:
+            np.random.seed(simSeed(sim, label, seed))
+            result += [alarm(vehicles1[sim], vehicles2[sim], simulation.MM1,
+                             simulation.MM2, simulation.times)]
+        results[label] = result
+        _saveShard(filename, results)
+    return shard, [label for label, alarm in alarmlist]
+
+def run(module, nsims=None, nshards=64, nworkers=None, seed=0,
+        storedir='shards', rerun=()):
+    """
+    Simulates every shard that has missing or rerun labels.
+
+    module = name of a simulate_X module
+    nsims = number of simulations, defaults to the module's nsims
+    nshards = number of shards, results are stored separately for each
+              number of shards
+    nworkers = number of processes, defaults to the number of cpus
+               if 1, simulation runs in this process
+    rerun = labels to simulate again even if they are stored
+    """
+    if nsims is None:
+        nsims = importlib.import_module(module).nsims
+    tasks = [(module, shard, nshards, nsims, seed, storedir, tuple(rerun))
+             for shard in range(nshards)]
+    if nworkers == 1:
+        finished = (_runShard(task) for task in tasks)
+    else:
+        pool = Pool(nworkers)
+        finished = pool.imap_unordered(_runShard, tasks)
+    for shard, labels in finished:
+        if len(labels) > 0:
+            print("shard {:d} ran {:s}".format(shard, ', '.join(labels)))
+    if nworkers != 1:
+        pool.close()
+        pool.join()
+    return merge(module, nsims, nshards, seed, storedir)
+
+def merge(module, nsims, nshards, seed=0, storedir='shards'):
+    """ Gathers the shards' results into a dict of label -> list of outputs in
+        simulation order, as returned by simulate_X.simulate. Only labels
+        that every shard has are included. """
+    shards = [loadShard(_shardFile(module, shard, nshards, nsims, seed,
+                                   storedir)) for shard in range(nshards)]
+    if any(results is None for results in shards):
+        raise Exception("missing shards, run them first")
+    labels = [label for label in shards[0] if label != 'sims' and
+              all(label in results for results in shards)]
+    merged = {}
+    for label in labels:
+        merged[label] = [None] * nsims
+        for results in shards:
+            for sim, output in zip(results['sims'], results[label]):
+                merged[label][sim] = output
+    return merged
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='run simulate_X in parallel')
+    parser.add_argument('module', help='simulate_1, simulate_2, or simulate_3')
+    parser.add_argument('--nsims', type=int, default=None)
+    parser.add_argument('--shards', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--storedir', default='shards')
+    parser.add_argument('--rerun', nargs='*', default=(),
+                        help='labels of alarms to simulate again')
+    args = parser.parse_args()
+
+    results = run(args.module, args.nsims, args.shards, args.workers,
+                  args.seed, args.storedir, args.rerun)
+    truth = np.array([pred for pred, rt in results['optimal']])
+    print("collisions {:.2f}".format(np.mean(truth)))
+    savename = importlib.import_module(args.module).savename
+    scoring.plotROC(truth, results, savename)
+    bigTable = scoring.bigTable(truth, results, z_cost_vals = [1,10,100])
+    print(bigTable)
+    if not savename is None:
+        bigTable.to_csv(savename+'_scores.csv')
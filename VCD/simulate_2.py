@@ -4,10 +4,11 @@
 Vehicles following set paths along a road, with a constant velocity model.
 
 Longer prediction than the first simulation.
+simulateParallel.py runs the same simulations split across processes.
 """
 
 import numpy as np
-import alarms, motionModels, scoring
+import alarms, motionModels, scoring, initialStates
 from collections import defaultdict
 from regressor_2 import Model
 
@@ -31,57 +32,54 @@ savename = 'sim2' # None #
 times = np.array([timeres] * int(timelen/timeres))
 MM1 = motionModels.MM_LineCV('left-right', np.diag([2., .5]))
 MM2 = motionModels.MM_LineCV('right-down', np.diag([2., .5]))
+mc_samplecounts = np.logspace(1,3,3).astype(int)
 
-v1 = np.random.normal(10., 5., nsims)
-x1 = np.random.normal(5, 2., nsims) - timeback * v1
-vehicle1 = np.array((x1,v1)).T
-v2 = np.random.normal(10., 5., nsims)
-x2 = np.random.normal(-5, 2., nsims) - timeback * v2
-vehicle2 = np.array((x2,v2)).T
 
+def scenario(nsims):
+    """ Random initial states for both vehicles in each simulation """
+    return initialStates.lineVehicles(nsims, timeback, initialcovariance)
 
-mc_samplecounts = np.logspace(1,3,3).astype(int)
-model = Model('MLP')
-        
-print "running"
-    
-truth = []
-results = defaultdict(list)
-for sim in range(nsims):
-    veh1 = vehicle1[sim,:]
-    veh2 = vehicle2[sim,:]
-    veh1 = motionModels.initialState_normal(veh1, initialcovariance)
-    veh2 = motionModels.initialState_normal(veh2, initialcovariance)
-    
-    # find 'true' collision occurrences by using very high-res MCS alarm
-    pred, rt = alarms.alarm_truth(veh1, veh2, MM1, MM2, np.array(times))
-    truth += [pred]
-    results['optimal'] += [(pred, rt)]
-    
+def alarmList():
+    """ (label, alarm) for each alarm being compared, with the same input and
+        output as the functions in alarms.py """
+    model = Model('MLP')
+    alarmlist = []
     for nSamples in mc_samplecounts:
-        result = alarms.alarm_MCS(veh1, veh2, MM1, MM2, times, nSamples)
-        label = str(nSamples)+" MCS"
-        results[label] += [result]
-            
-    result = model.alarm(veh1, veh2, MM1, MM2, times)
-    results['MLP'] += [result]
-    
-    result = alarms.alarm_expected(veh1, veh2, MM1, MM2, times)
-    results['expected'] += [result]
+        alarmlist += [(str(nSamples)+" MCS",
+                       lambda v1,v2,M1,M2,t,n=nSamples:
+                           alarms.alarm_MCS(v1,v2,M1,M2,t,n))]
+    alarmlist += [('MLP', model.alarm),
+                  ('expected', alarms.alarm_expected),
+                  ('UT 1', alarms.alarm_UT_1),
+                  ('UT 2', alarms.alarm_UT_2)]
+    return alarmlist
+
+def simulate(vehicles1, vehicles2, alarmlist):
+    """ Runs every alarm on each pair of vehicles, returns a dict of
+        label -> list of alarm outputs, as used by scoring.bigTable """
+    results = defaultdict(list)
+    # find 'true' collision occurrences by using very high-res MCS alarm
+    results['optimal'] = alarms.alarm_truth_batch(vehicles1, vehicles2,
+                                                  MM1, MM2, np.array(times))
+    for sim in range(len(vehicles1)):
+        veh1 = vehicles1[sim]
+        veh2 = vehicles2[sim]
+        for label, alarm in alarmlist:
+            results[label] += [alarm(veh1, veh2, MM1, MM2, times)]
+    return results
 
-    result = alarms.alarm_UT_1(veh1, veh2, MM1, MM2, times)
-    results['UT 1'] += [result]
-    
-    result = alarms.alarm_UT_2(veh1, veh2, MM1, MM2, times)
-    results['UT 2'] += [result]
 
+if __name__ == '__main__':
+    print("running")
+    vehicles1, vehicles2 = scenario(nsims)
+    results = simulate(vehicles1, vehicles2, alarmList())
+    truth = np.array([pred for pred, rt in results['optimal']])
 
-truth = np.array(truth)
-ProbabilityOfCollision = sum(truth)/nsims
-print "collisions "+str(ProbabilityOfCollision)
+    ProbabilityOfCollision = sum(truth)/nsims
+    print("collisions "+str(ProbabilityOfCollision))
 
-scoring.plotROC(truth, results, savename)
-bigTable = scoring.bigTable(truth, results, z_cost_vals = [1,10,100])
-print bigTable
-if not savename is None:
-    bigTable.to_csv(savename+'_scores.csv')
\ No newline at end of file
+    scoring.plotROC(truth, results, savename)
+    bigTable = scoring.bigTable(truth, results, z_cost_vals = [1,10,100])
+    print(bigTable)
+    if not savename is None:
+        bigTable.to_csv(savename+'_scores.csv')
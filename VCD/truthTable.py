@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Generates training data for the regressor modules in parallel, saving as it
+goes so that an interrupted run can pick up where it left off.
+
+Each regressor module defines simulatePoint(x, nrepeats), which returns the
+probability of collision for a single row of simulation inputs, such as both
+vehicles' initial states. The rows are split into chunks that are simulated by
+a pool of processes. Before each row is simulated, the random generator is
+seeded from the row's values, so a row gets the same result no matter which
+chunk or process handles it.
+
+Finished chunks are stored as .npz files with two columns, 'X' for inputs and
+'Y' for probabilities, in one folder per scenario, number of repeats and seed.
+A scenario names everything that affects the result besides the inputs (motion
+models, noise, timesteps), so regressor variants that simulate the same
+scenario share their results, and rows that were already simulated are never
+simulated again. The inputs should
+be physical quantities rather than a regressor's normalized features, so that
+variants with different normalizations can share them.
+"""
+import os
+import zlib
+import numpy as np
+from multiprocessing import Pool
+
+
+def pointSeed(x, seed=0):
+    """ A random seed determined by the values of one row of inputs. """
+    return (zlib.crc32(np.ascontiguousarray(x, dtype=float).tobytes()) ^ seed)\
+                & 0xffffffff
+
+def _simulateChunk(args):
+    simulatePoint, X, nrepeats, seed = args
+    Y = np.empty((X.shape[0],))
+    for point in range(X.shape[0]):
+        np.random.seed(pointSeed(X[point], seed))
+        Y[point] = simulatePoint(X[point], nrepeats)
+    return X, Y
+
+def _folder(scenario, nrepeats, storedir, seed):
+    return os.path.join(storedir, '{:s}_{:d}_seed{:d}'.format(scenario,
+                                                              nrepeats, seed))
+
+def load(scenario, nrepeats, storedir='truth', seed=0):
+    """ Returns all inputs and probabilities stored for this scenario. """
+    folder = _folder(scenario, nrepeats, storedir, seed)
+    X = []
+    Y = []
+    if os.path.isdir(folder):
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith('.npz'): continue
+            chunk = np.load(os.path.join(folder, filename))
+            X += [chunk['X']]
+            Y += [chunk['Y']]
+    if len(X) == 0:
+        return np.zeros((0,0)), np.zeros((0,))
+    return np.concatenate(X), np.concatenate(Y)
+
+def _save(folder, X, Y):
+    """ Writes a chunk under a temporary name, then renames it, so a chunk file
+        is never half-written. """
+    count = len([filename for filename in os.listdir(folder)
+                 if filename.endswith('.npz')])
+    filename = os.path.join(folder, 'chunk_{:06d}.npz'.format(count))
+    while os.path.exists(filename):
+        count += 1
+        filename = os.path.join(folder, 'chunk_{:06d}.npz'.format(count))
+    with open(filename + '.tmp', 'wb') as fileobj:
+        np.savez(fileobj, X=X, Y=Y)
+    os.rename(filename + '.tmp', filename)
+
+def generate(scenario, X_0, simulatePoint, nrepeats, storedir='truth',
+             nworkers=None, chunksize=500, seed=0):
+    """
+    Returns the probability of collision for each row of X_0, simulating only
+    the rows that are not already stored.
+
+    scenario = name of the simulation setup, see the module documentation
+    simulatePoint = module-level function (x, nrepeats) -> probability
+    nworkers = number of processes, defaults to the number of cpus
+               if 1, simulation runs in this process
+    chunksize = number of rows simulated and saved together
+    seed = combined with each row's values to seed its simulation
+    """
+    folder = _folder(scenario, nrepeats, storedir, seed)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    storedX, storedY = load(scenario, nrepeats, storedir, seed)
+    known = dict((x.tobytes(), y) for x, y in zip(storedX, storedY))
+
+    X_0 = np.ascontiguousarray(X_0, dtype=float)
+    missing = np.array([x.tobytes() not in known for x in X_0], dtype=bool)
+    X_missing = X_0[missing]
+    # rows that appear twice only need to be simulated once
+    if X_missing.shape[0] > 0:
+        X_missing = np.unique(X_missing, axis=0)
+    print("{:d} of {:d} points already stored, simulating {:d}".format(
+            X_0.shape[0] - np.sum(missing), X_0.shape[0], X_missing.shape[0]))
+    tasks = [(simulatePoint, X_missing[start:start+chunksize], nrepeats, seed)
+             for start in range(0, X_missing.shape[0], chunksize)]
+
+    pool = None
+    if nworkers == 1:
+        finished = (_simulateChunk(task) for task in tasks)
+    else:
+        pool = Pool(nworkers)
+        finished = pool.imap_unordered(_simulateChunk, tasks)
+    try:
+        for X, Y in finished:
+            _save(folder, X, Y)
+            known.update((x.tobytes(), y) for x, y in zip(X, Y))
+    finally:
+        # if a chunk failed, the others are stopped rather than waited for,
+        # the saved chunks are kept for the next run
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return np.array([known[x.tobytes()] for x in X_0])